@@ -12,8 +12,13 @@
 # @brief	Application package init file
 
 #----- Imports
+import sqlite3
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
 from .config import Config
 
 
@@ -33,6 +38,17 @@ if app.config['DUDE_SECRET_KEY'] is None:
 # define SQLAlchemy object
 db = SQLAlchemy(app)
 
+# apply the pragmas on each new SQLite connection
+@event.listens_for(Engine, "connect")
+def setSQLitePragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
 # print the api-key for administrative tasks
 if app.config['DEBUG'] == True:
     app.logger.info(getMessage(0x0001, apikey=app.config['DUDE_SECRET_KEY']))
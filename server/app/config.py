@@ -14,6 +14,8 @@
 #----- Imports
 import os
 
+from sqlalchemy.pool import QueuePool
+
 #----- GLobals
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -26,6 +28,23 @@ class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, "../..", "dude.sqlite")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # pool of SQLite connections kept open by each worker (pragmas and page cache survive requests)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': QueuePool,
+        'pool_size': int(os.environ.get("DUDE_SQLITE_POOL_SIZE", 5)),
+        'connect_args': { 'check_same_thread': False }
+    }
+
+    # pragmas applied on each new SQLite connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get("DUDE_SQLITE_JOURNAL_MODE", "WAL"),
+        'synchronous': os.environ.get("DUDE_SQLITE_SYNCHRONOUS", "NORMAL"),
+        'busy_timeout': int(os.environ.get("DUDE_SQLITE_BUSY_TIMEOUT", 5000)),          # milliseconds
+        'cache_size': int(os.environ.get("DUDE_SQLITE_CACHE_SIZE", -65536)),            # negative value is in KiB
+        'mmap_size': int(os.environ.get("DUDE_SQLITE_MMAP_SIZE", 268435456)),           # bytes
+        'temp_store': os.environ.get("DUDE_SQLITE_TEMP_STORE", "MEMORY")
+    }
+
     # application semantic version
     VERSION = "1.0.0"
 
@@ -33,8 +52,56 @@ class Config:
     MAX_LIMIT_VALUE = 20
     DEFAULT_LIMIT_VALUE = 10
 
+    # max value for the Limit parameter when an administrator synchronises a table (sync=1)
+    MAX_SYNC_LIMIT_VALUE = int(os.environ.get("DUDE_MAX_SYNC_LIMIT_VALUE", 1000))
+
+    # an estimated total (total=estimate) stops counting after this number of rows
+    COUNT_ESTIMATE_LIMIT = int(os.environ.get("DUDE_COUNT_ESTIMATE_LIMIT", 10000))
+
+    # number of rows fetched at once from the database by the /export endpoint
+    EXPORT_BATCH_SIZE = 1000
+
     # token expiry time in minutes
     TOKEN_EXPIRY_MINUTES = 15
 
+    # software recently authenticated by each worker
+    CREDENTIALS_CACHE_SIZE = int(os.environ.get("DUDE_CREDENTIALS_CACHE_SIZE", 1024))
+    CREDENTIALS_CACHE_TTL = float(os.environ.get("DUDE_CREDENTIALS_CACHE_TTL", 60))
+
+    # a token is handed back by /auth while at least this number of minutes remain
+    TOKEN_REUSE_MIN_MINUTES = float(os.environ.get("DUDE_TOKEN_REUSE_MIN_MINUTES", 10))
+
+    # max number of verified / issued tokens kept in memory by each worker
+    TOKEN_CACHE_SIZE = int(os.environ.get("DUDE_TOKEN_CACHE_SIZE", 4096))
+
+    # permission decision cache for the /validate endpoint
+    # entries are invalidated on writes in this worker, and ignored once the version of their team changed
+    PERMISSION_CACHE_SIZE = int(os.environ.get("DUDE_PERMISSION_CACHE_SIZE", 65536))
+    PERMISSION_CACHE_TTL = float(os.environ.get("DUDE_PERMISSION_CACHE_TTL", 30))
+
+    # the version of a team (bumped by any worker's write to its users/rights/grants) is read again
+    # after this number of seconds: a write made by another worker is seen at most this late (0 = always read)
+    PERMISSION_VERSION_INTERVAL = float(os.environ.get("DUDE_PERMISSION_VERSION_INTERVAL", 1))
+
+    # /validate answers from a compiled snapshot of each team: "memory", "mmap" or "" (disabled)
+    # "memory": the snapshot of a team is rebuilt when the version of the team differs from
+    # the one read at build time, and after PERMISSION_CACHE_TTL
+    # "mmap": one file of all the teams is rebuilt on writes and shared by all the workers
+    PERMISSION_SNAPSHOT = os.environ.get("DUDE_PERMISSION_SNAPSHOT", "memory")
+    PERMISSION_SNAPSHOT_PATH = os.environ.get("DUDE_PERMISSION_SNAPSHOT_PATH", os.path.join(basedir, "../..", "snapshot"))
+
+    # expected false-positive rate of the per-team Bloom filters of emails and rights (0 disables them)
+    # they reject unknown users/rights without a query when the snapshot is disabled
+    PERMISSION_BLOOM_FP_RATE = float(os.environ.get("DUDE_PERMISSION_BLOOM_FP_RATE", 0.01))
+
+    # max number of (email, right) pairs in a /validate/batch request
+    MAX_BATCH_SIZE = 200
+
+    # JSON encoder of the responses: "auto" (orjson if installed), "orjson" or "json"
+    JSON_SERIALIZER = os.environ.get("DUDE_JSON_SERIALIZER", "auto")
+
+    # responses smaller than this number of bytes are never compressed (gzip / br / zstd)
+    COMPRESSION_MIN_SIZE = int(os.environ.get("DUDE_COMPRESSION_MIN_SIZE", 1024))
+
     # default locale
     DEFAULT_LOCALE = "en_US"
@@ -10,9 +10,11 @@ from .user_right import blueprint as BPUserRight
 
 from .auth import blueprint as BPAuth
 from .validate import blueprint as BPValidate
+from .export import blueprint as BPExport
+from .bulk_import import blueprint as BPImport
 
 routes = [
     BPCompany, BPUnit, BPTeam, BPUser,
     BPRight, BPSoftware, BPUserRight,
-    BPAuth, BPValidate
+    BPAuth, BPValidate, BPExport, BPImport
 ]
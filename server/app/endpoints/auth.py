@@ -13,18 +13,10 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import Optional
-
-import jwt
-import datetime
-
 from flask import Blueprint, request
 
-from app import app
-from app.models import Software
-
 from app.helpers import (
-    Validator, HTTPResponse
+    Validator, HTTPResponse, Credentials, Token
 )
 
 
@@ -49,10 +41,7 @@ def post_auth():
         500 Internal Server Error
     """
     # retrieve the data if any
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -60,26 +49,19 @@ def post_auth():
     except KeyError as e:
         return HTTPResponse.error(0x4001, name=str(e))
 
-    # lookup for the software in the database
-    software: Optional[Software] = Software.query.filter_by(name=data['name'], apikey=data['apikey']).first()
+    # the credentials are hashed as strings
+    for field in [ 'name', 'apikey' ]:
+        if not isinstance(data[field], str):
+            return HTTPResponse.error(0x4004, name=field, type='string')
+
+    # lookup for the software from the digest of its apikey
+    software = Credentials.lookup(data['name'], data['apikey'])
     if not software:
         return HTTPResponse.error(0x4040, name='Software')
 
     try:
-        # issue at and expiry time
-        iat = datetime.datetime.utcnow()
-        exp = iat + datetime.timedelta(minutes=app.config['TOKEN_EXPIRY_MINUTES'])
-
-        # generate a new JSON Web Token
-        payload = {
-            'apikey': software.apikey,
-            'name': software.name,
-            'team_id': f"{software.team_id}",
-            'iat': iat.timestamp(),
-            'exp': exp.timestamp()
-        }
-
-        token = jwt.encode(payload, app.config['DUDE_SECRET_KEY'], "HS256")
+        # reuse the last token of this software or generate a new one
+        token = Token.issue(software)
         return HTTPResponse.ok({ 'token': token })
 
     except Exception as e:
@@ -94,7 +76,6 @@ def default_auth():
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed(allowed="POST")
 
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Flask route for the "import" endpoint
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import json
+
+from uuid import uuid4
+
+from flask import Blueprint, request
+from sqlalchemy import select, insert
+
+from app import db
+from app.models import (
+    Company, Unit, Team, User, Right, Software, UserRight
+)
+
+from app.helpers import (
+    authenticate, Validator, HTTPResponse, Permission
+)
+
+from app.localization import getMessage
+
+
+#----- Globals
+blueprint = Blueprint('import', __name__, url_prefix="/import")
+
+# valid routes for this blueprint
+ROUTE_1=""
+
+# max number of values in a single IN (...) clause
+CHUNK_SIZE = 500
+
+
+#----- Functions
+
+def chunks(values: List[Any]) -> Iterator[List[Any]]:
+    """Split a list of values for the IN (...) clauses"""
+    for index in range(0, len(values), CHUNK_SIZE):
+        yield values[index:index + CHUNK_SIZE]
+
+def lookup(columns: List[Any], column: Any, values: List[Any]) -> List[Any]:
+    """Retrieve the rows where a column is in a list of values
+
+    Args:
+        columns: the columns to retrieve
+        column: the column to filter on
+        values: the list of values
+
+    Returns:
+        the list of rows
+    """
+    rows: List[Any] = []
+    for chunk in chunks(list(set(values))):
+        rows.extend(db.session.execute(select(*columns).where(column.in_(chunk))).all())
+    return rows
+
+def bulkInsert(model: Any, rows: List[Dict[str, Any]]) -> None:
+    """Insert a list of records with a single executemany statement"""
+    if rows:
+        db.session.execute(insert(model), rows)
+
+def software(name: str, apikey: str, team_id: int) -> Dict[str, Any]:
+    """Create a new software record (bulk inserts do not go through the model)"""
+    return { 'name': name, 'apikey': apikey, 'apikey_digest': Software.digest(apikey), 'team_id': team_id }
+
+def fields(record: Any, names: List[str]) -> None:
+    """Check that a record of the tree holds its mandatory fields as strings
+
+    Args:
+        record: the record (company, unit, team, ...)
+        names: the mandatory fields of the record
+
+    Raises:
+        'KeyError' if a field is missing, 'TypeError' if the record is not
+        an object or a field is not a string
+    """
+    if not isinstance(record, dict):
+        raise TypeError(record)
+
+    Validator.data(record, names)
+    for name in names:
+        if not isinstance(record[name], str):
+            raise TypeError(name)
+
+def parse(companies: List[Dict[str, Any]]) -> Dict[str, List[Tuple]]:
+    """Flatten the tree of companies into one list of records per table
+
+    Args:
+        companies: the list of companies with their units, teams, ...
+
+    Raises:
+        'KeyError' if a mandatory field is missing, 'TypeError' if it is not a string
+
+    Returns:
+        the records of each table, identified by the names of their parents
+    """
+    records: Dict[str, List[Tuple]] = {
+        'companies': [], 'units': [], 'teams': [],
+        'users': [], 'rights': [], 'software': [], 'grants': []
+    }
+
+    for company in companies:
+        fields(company, [ 'name' ])
+        records['companies'].append((company['name'],))
+
+        for unit in company.get('units', []):
+            fields(unit, [ 'name' ])
+            records['units'].append((company['name'], unit['name']))
+
+            for team in unit.get('teams', []):
+                fields(team, [ 'name' ])
+                key = (company['name'], unit['name'], team['name'])
+                records['teams'].append(key)
+
+                for user in team.get('users', []):
+                    fields(user, [ 'name', 'email' ])
+                    records['users'].append((key, user['name'], user['email']))
+
+                for right in team.get('rights', []):
+                    fields(right, [ 'name' ])
+                    records['rights'].append((key, right['name']))
+
+                for software in team.get('software', []):
+                    fields(software, [ 'name' ])
+                    records['software'].append((key, software['name']))
+
+                for grant in team.get('grants', []):
+                    fields(grant, [ 'email', 'right' ])
+                    records['grants'].append((key, grant['email'], grant['right']))
+
+    return records
+
+def load(records: Dict[str, List[Tuple]]) -> List[Dict[str, Any]]:
+    """Insert the records level by level within the current transaction
+
+    Existing records are resolved with set-based lookups and reused, the
+    missing ones are inserted with one executemany statement per table.
+
+    Args:
+        records: the records returned by parse()
+
+    Returns:
+        the result for each record
+    """
+    results: List[Dict[str, Any]] = []
+
+    def result(table: str, key: Tuple, status: str, rid: Any = None, message: str = None) -> Dict[str, Any]:
+        item = { "table": table, "key": "/".join(key), "status": status, "id": rid }
+        if message:
+            item['message'] = message
+        results.append(item)
+        return item
+
+    def resolve(model: Any, keys: List[Tuple], fetch: Callable[[], Dict[Tuple, int]], create: Callable[[Tuple], Dict[str, Any]]) -> Dict[Tuple, int]:
+        """Insert the missing keys of a table and return the ID of all the keys"""
+        keys = list(dict.fromkeys(keys))
+
+        existing = fetch()
+        created = [ key for key in keys if key not in existing ]
+        bulkInsert(model, [ create(key) for key in created ])
+
+        ids = fetch() if created else existing
+        for key in keys:
+            result(model.__tablename__, key, "existing" if key in existing else "created", ids[key])
+
+        return ids
+
+    # companies
+    names = [ name for name, in records['companies'] ]
+    companies = resolve(Company, records['companies'],
+        lambda: { (name,): rid for name, rid in lookup([ Company.name, Company.id ], Company.name, names) },
+        lambda key: { 'name': key[0] }
+    )
+
+    # units
+    company_names = { rid: name for (name,), rid in companies.items() }
+    units = resolve(Unit, records['units'],
+        lambda: {
+            (company_names[company_id], name): rid
+            for company_id, name, rid in lookup([ Unit.company_id, Unit.name, Unit.id ], Unit.company_id, list(company_names))
+        },
+        lambda key: { 'name': key[1], 'company_id': companies[key[:1]] }
+    )
+
+    # teams
+    unit_keys = { rid: key for key, rid in units.items() }
+    teams = resolve(Team, records['teams'],
+        lambda: {
+            (*unit_keys[unit_id], name): rid
+            for unit_id, name, rid in lookup([ Team.unit_id, Team.name, Team.id ], Team.unit_id, list(unit_keys))
+        },
+        lambda key: { 'name': key[2], 'unit_id': units[key[:2]] }
+    )
+
+    # rights and software of the teams
+    team_keys = { rid: key for key, rid in teams.items() }
+    rights = resolve(Right, [ (*key, name) for key, name in records['rights'] ],
+        lambda: {
+            (*team_keys[team_id], name): rid
+            for team_id, name, rid in lookup([ Right.team_id, Right.name, Right.id ], Right.team_id, list(team_keys))
+        },
+        lambda key: { 'name': key[3], 'team_id': teams[key[:3]] }
+    )
+
+    resolve(Software, [ (*key, name) for key, name in records['software'] ],
+        lambda: {
+            (*team_keys[team_id], name): rid
+            for team_id, name, rid in lookup([ Software.team_id, Software.name, Software.id ], Software.team_id, list(team_keys))
+        },
+        lambda key: software(key[3], str(uuid4()), teams[key[:3]])
+    )
+
+    # users (emails are unique across all the teams)
+    emails: Dict[str, Tuple[int, Optional[int]]] = {
+        email: (team_id, rid)
+        for email, team_id, rid in lookup([ User.email, User.team_id, User.id ], User.email, [ email for _, _, email in records['users'] ])
+    }
+
+    rows: List[Dict[str, Any]] = []
+    pending: List[Tuple[str, Dict[str, Any]]] = []
+    for key, name, email in records['users']:
+        team_id = teams[key]
+        if (email in emails) and (emails[email][0] != team_id):
+            result("user", (*key, email), "error", message=getMessage(0x4003, name="Email"))
+            continue
+
+        if email in emails:
+            pending.append((email, result("user", (*key, email), "existing", emails[email][1])))
+            continue
+
+        emails[email] = (team_id, None)
+        rows.append({ 'name': name, 'email': email, 'team_id': team_id })
+        pending.append((email, result("user", (*key, email), "created")))
+
+    bulkInsert(User, rows)
+    if rows:
+        created = dict(lookup([ User.email, User.id ], User.email, [ row['email'] for row in rows ]))
+        for email, rid in created.items():
+            emails[email] = (emails[email][0], rid)
+
+    for email, item in pending:
+        item['id'] = emails[email][1]
+
+    # grants between users and rights of the same team
+    user_ids = [ rid for team_id, rid in emails.values() if team_id in team_keys ]
+    grants = set(lookup([ UserRight.user_id, UserRight.right_id ], UserRight.user_id, user_ids))
+
+    rows = []
+    for key, email, right in dict.fromkeys(records['grants']):
+        user = emails.get(email)
+        if (not user) or (user[0] != teams[key]):
+            result("user_right", (*key, email, right), "error", message=getMessage(0x4040, name='User'))
+            continue
+
+        if (*key, right) not in rights:
+            result("user_right", (*key, email, right), "error", message=getMessage(0x4040, name='Right'))
+            continue
+
+        pair = (user[1], rights[(*key, right)])
+        if pair in grants:
+            result("user_right", (*key, email, right), "existing")
+        else:
+            grants.add(pair)
+            rows.append({ 'user_id': pair[0], 'right_id': pair[1] })
+            result("user_right", (*key, email, right), "created")
+
+    bulkInsert(UserRight, rows)
+
+    return results
+
+#
+# generic routes
+#
+@blueprint.route(ROUTE_1, methods=["POST"])
+@authenticate
+def post_import():
+    """Import a tree of companies / units / teams / users, rights, software and grants
+
+    The body is either a JSON document { "companies": [...] } or a NDJSON
+    stream with one company per line. Everything is inserted in one transaction.
+
+    Returns:
+        200 OK
+        400 Bad Request
+        500 Internal Server Error
+    """
+    try:
+        if request.mimetype == "application/x-ndjson":
+            companies = [ json.loads(line) for line in request.get_data().splitlines() if line.strip() ]
+        else:
+            companies = Validator.body(request).get('companies', [])
+
+        records = parse(companies)
+
+    except KeyError as e:
+        return HTTPResponse.error(0x4001, name=str(e))
+
+    except (ValueError, AttributeError, TypeError):
+        return HTTPResponse.error(0x4004, name='companies', type='company tree')
+
+    try:
+        results = load(records)
+        db.session.commit()
+
+        Permission.invalidate()
+
+        # summary of the results for each table
+        counts: Dict[str, Dict[str, int]] = {}
+        for item in results:
+            table = counts.setdefault(item['table'], { "created": 0, "existing": 0, "error": 0 })
+            table[item['status']] += 1
+
+        return HTTPResponse.ok({
+            "counts": counts,
+            "results": results
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return HTTPResponse.internalError(str(e))
+
+@blueprint.route(ROUTE_1, methods=["GET", "PUT", "DELETE"])
+@authenticate
+def default_import():
+    """Default route for other methods than POST
+
+    Returns:
+        405 Method not allowed
+    """
+    # this line ensures flask does not return errors if data is not purged
+    Validator.body(request)
+    return HTTPResponse.notAllowed("POST")
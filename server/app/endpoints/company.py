@@ -13,15 +13,16 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import Any, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from flask import Blueprint, request, url_for
+from sqlalchemy import select
 
-from app import app, db
-from app.models import Company, Unit
+from app import db
+from app.models import Company, Unit, Team, User, Right, Software
 
 from app.helpers import (
-    authenticate, Validator, HTTPResponse, Database
+    authenticate, Validator, HTTPResponse, Database, Paginator, ETag, Serializer
 )
 
 
@@ -32,9 +33,106 @@ blueprint = Blueprint('company', __name__, url_prefix="/companies")
 ROUTE_1=""
 ROUTE_2="/<int:company_id>"
 ROUTE_3="/<int:company_id>/units"
+ROUTE_4="/<int:company_id>/tree"
+
+# max depth of a tree: 1 = units, 2 = teams, 3 = users / rights / software
+MAX_TREE_DEPTH = 3
+
+# collections of the teams that can be selected in a tree
+TREE_FIELDS = {
+    "users": (User, [ User.id, User.name, User.email ]),
+    "rights": (Right, [ Right.id, Right.name ]),
+    "software": (Software, [ Software.id, Software.name, Software.apikey ])
+}
 
 
 #----- Functions
+
+def subtree(company: Company, depth: int, fields: List[str]) -> Tuple[List[Any], Dict[int, List[Dict[str, Any]]]]:
+    """Load the units and the teams of a company with one query per level
+
+    Args:
+        company: the root of the tree
+        depth: number of levels to load below the company
+        fields: the collections to load for each team
+
+    Returns:
+        the units of the company and the teams of each unit
+    """
+    units: List[Any] = []
+    teams: Dict[int, List[Dict[str, Any]]] = {}
+
+    if depth >= 1:
+        units = db.session.execute(
+            select(Unit.id, Unit.name).where(Unit.company_id == company.id).order_by(Unit.id)
+        ).all()
+
+    if depth >= 2:
+        # the children of each level are selected with a subquery on the previous one
+        unit_ids = select(Unit.id).where(Unit.company_id == company.id)
+        team_ids = select(Team.id).where(Team.unit_id.in_(unit_ids))
+
+        members: Dict[Tuple[int, str], List[Dict[str, Any]]] = {}
+        for name in (fields if depth >= 3 else []):
+            model, columns = TREE_FIELDS[name]
+            keys = [ column.key for column in columns ]
+
+            rows = db.session.execute(
+                select(model.team_id, *columns).where(model.team_id.in_(team_ids)).order_by(model.id)
+            )
+            for team_id, *values in rows:
+                members.setdefault((team_id, name), []).append(dict(zip(keys, values)))
+
+        rows = db.session.execute(
+            select(Team.unit_id, Team.id, Team.name).where(Team.unit_id.in_(unit_ids)).order_by(Team.id)
+        )
+        for unit_id, team_id, name in rows:
+            team: Dict[str, Any] = { "id": team_id, "name": name }
+            for field in (fields if depth >= 3 else []):
+                team[field] = members.get((team_id, field), [])
+            teams.setdefault(unit_id, []).append(team)
+
+    return units, teams
+
+def nodes(depth: int, units: List[Any], teams: Dict[int, List[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """Produce the units of a company with their teams, one at a time"""
+    for unit_id, name in units:
+        unit: Dict[str, Any] = { "id": unit_id, "name": name }
+        if depth >= 2:
+            unit['teams'] = teams.get(unit_id, [])
+        yield unit
+
+def tree(company: Company, depth: int, units: List[Any], teams: Dict[int, List[Dict[str, Any]]], mimetype: str) -> Iterator[bytes]:
+    """Produce the nested document of a company, one unit at a time
+
+    Args:
+        company: the root of the tree
+        depth: number of levels below the company
+        units: the units returned by subtree()
+        teams: the teams returned by subtree()
+        mimetype: the mimetype returned by Serializer.negotiate()
+
+    Returns:
+        a generator of JSON fragments, or the whole MessagePack document
+    """
+    if mimetype != Serializer.JSON:
+        # MessagePack has no fragments to concatenate: the document is encoded at once
+        document: Dict[str, Any] = { "id": company.id, "name": company.name }
+        if depth >= 1:
+            document['units'] = list(nodes(depth, units, teams))
+        yield Serializer.encode(document, mimetype)
+        return
+
+    yield b'{"id":%d,"name":%s' % (company.id, Serializer.dumps(company.name))
+
+    if depth >= 1:
+        yield b',"units":['
+        for index, unit in enumerate(nodes(depth, units, teams)):
+            yield (b',' if index else b'') + Serializer.dumps(unit)
+        yield b']'
+
+    yield b'}'
+
 #
 # generic routes
 #
@@ -48,10 +146,7 @@ def post_company():
         500 Internal Server Error
         400 Bad Request
     """
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -79,44 +174,34 @@ def post_company():
 @authenticate
 def get_company():
     """Retrieve all the companies"""
-    # retrieve the parameters from the request (or set the default value)
+    # retrieve the pagination parameters from the request (or set the default value)
     try:
-        params = Validator.parameters(request, [('offset', 0), ('limit', app.config['DEFAULT_LIMIT_VALUE'])])
+        params = Paginator.parameters(request)
     except ValueError as e:
         return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
 
-    # ensure parameters remains positive
-    params['offset'] = abs(params['offset'])
-    params['limit'] = abs(params['limit'])
-
-    if params['limit'] > app.config['MAX_LIMIT_VALUE']:
-        params['limit'] = app.config['MAX_LIMIT_VALUE']
-
     try:
-        # retrieve all the items between the limits
-        items: List[Company] = (db.session
-            .query(Company)
-            .order_by(Company.id)
-            .filter(Company.id >= params['offset'])
-            .limit(params['limit'])
-            .all()
-        )
+        # nothing to send if the table did not change since the last request
+        etag = ETag.table(Company)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # retrieve the items of the page
+        items, page = Paginator.page(db.session.query(Company), Company.id, params)
 
         # build the result dictionary
         result = {
-            "offset": f"{params['offset']}",
-            "limit": f"{params['limit']}",
-            "count": f"{len(items)}",
+            **page,
             "companies": [
                 {
-                    "id": f"{item.id}",
+                    "id": item.id,
                     "name": item.name
                 } for item in items
             ]
         }
 
         # return the response
-        return HTTPResponse.ok(result)
+        return HTTPResponse.ok(result, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -130,8 +215,7 @@ def put_company():
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed(allowed="POST, GET, DELETE")
 
 @blueprint.route(ROUTE_1, methods=["DELETE"])
@@ -145,7 +229,6 @@ def delete_company():
     """
     try:
         Database.deleteAll()
-        db.session.commit()
         return HTTPResponse.noContent()
 
     except Exception as e:
@@ -164,8 +247,7 @@ def post_single_company(company_id):
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("GET, PUT, DELETE")
 
 @blueprint.route(ROUTE_2, methods=["GET"])
@@ -183,10 +265,15 @@ def get_single_company(company_id):
         return HTTPResponse.error(0x4041, table='Company', rid=company_id)
 
     try:
-        return  HTTPResponse.ok({
-            'id': f"{company.id}",
+        # the client already holds this version of the company
+        etag = ETag.row(company)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        return HTTPResponse.ok({
+            'id': company.id,
             'name': company.name
-        })
+        }, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -202,10 +289,7 @@ def put_single_company(company_id):
         404 Not found
         500 Internal Server Error
     """
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # lookup for the company
     company: Optional[Company] = Company.query.filter_by(id=company_id).first()
@@ -265,10 +349,7 @@ def post_single_company_units(company_id):
         404 Not found
         500 Internal Server Error
     """
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # lookup for the company
     company: Optional[Company] = Company.query.filter_by(id=company_id).first()
@@ -311,45 +392,34 @@ def get_single_company_units(company_id):
     if not company:
         return HTTPResponse.error(0x4041, table='Company', rid=company_id)
 
-    # retrieve the parameters from the request (or set the default value)
+    # retrieve the pagination parameters from the request (or set the default value)
     try:
-        params = Validator.parameters(request, [('offset', 0), ('limit', app.config['DEFAULT_LIMIT_VALUE'])])
+        params = Paginator.parameters(request)
     except ValueError as e:
         return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
 
-    # ensure parameters remains positive
-    params['offset'] = abs(params['offset'])
-    params['limit'] = abs(params['limit'])
-
-    if params['limit'] > app.config['MAX_LIMIT_VALUE']:
-        params['limit'] = app.config['MAX_LIMIT_VALUE']
-
     try:
-        # retrieve all the items between the limits
-        items: List[Unit] = (db.session
-            .query(Unit)
-            .order_by(Unit.id)
-            .filter(Unit.company_id == company.id)
-            .filter(Unit.id >= params['offset'])
-            .limit(params['limit'])
-            .all()
-        )
+        # nothing to send if the table did not change since the last request
+        etag = ETag.table(Unit)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # retrieve the items of the page
+        items, page = Paginator.page(db.session.query(Unit).filter(Unit.company_id == company.id), Unit.id, params)
 
         # build the result dictionary
         result = {
-            "offset": f"{params['offset']}",
-            "limit": f"{params['limit']}",
-            "count": f"{len(items)}",
+            **page,
             "units": [
                 {
-                    "id": f"{item.id}",
+                    "id": item.id,
                     "name": item.name
                 } for item in items
             ]
         }
 
         # return the response
-        return HTTPResponse.ok(result)
+        return HTTPResponse.ok(result, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -363,8 +433,7 @@ def put_single_company_units(company_id):
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("POST, GET, DELETE")
 
 @blueprint.route(ROUTE_3, methods=["DELETE"])
@@ -389,3 +458,61 @@ def delete_single_company_units(company_id):
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
+
+@blueprint.route(ROUTE_4, methods=["GET"])
+@authenticate
+def get_single_company_tree(company_id):
+    """Retrieve a company with its units, teams, users, rights and software
+
+    The 'depth' parameter limits the number of levels (0 to 3) and the
+    'fields' parameter selects the collections of the teams.
+
+    Returns:
+        200 OK
+        400 Bad Request
+        404 Not found
+        500 Internal Server Error
+    """
+    # retrieve the parameters from the request (or set the default value)
+    try:
+        params = Validator.parameters(request, [('depth', MAX_TREE_DEPTH), ('fields', ",".join(TREE_FIELDS))])
+    except ValueError as e:
+        return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
+
+    if not 0 <= params['depth'] <= MAX_TREE_DEPTH:
+        return HTTPResponse.error(0x4004, name='depth', type=f"0..{MAX_TREE_DEPTH}")
+
+    fields = [ field for field in params['fields'].split(",") if field ]
+    if any(field not in TREE_FIELDS for field in fields):
+        return HTTPResponse.error(0x4004, name='fields', type=" | ".join(TREE_FIELDS))
+
+    # lookup for the company
+    company: Optional[Company] = Company.query.filter_by(id=company_id).first()
+    if not company:
+        return HTTPResponse.error(0x4041, table='Company', rid=company_id)
+
+    try:
+        # everything is loaded before streaming so errors are still reported
+        units, teams = subtree(company, params['depth'], fields)
+
+        mimetype = Serializer.negotiate()
+        response = HTTPResponse.stream(tree(company, params['depth'], units, teams, mimetype), mimetype)
+        if len(Serializer.mimetypes) > 1:
+            response.vary.add('Accept')
+
+        return response
+
+    except Exception as e:
+        return HTTPResponse.internalError(str(e))
+
+@blueprint.route(ROUTE_4, methods=["POST", "PUT", "DELETE"])
+@authenticate
+def default_single_company_tree(company_id):
+    """Default route for other methods than GET
+
+    Returns:
+        405 Method not allowed
+    """
+    # this line ensures flask does not return errors if data is not purged
+    Validator.body(request)
+    return HTTPResponse.notAllowed("GET")
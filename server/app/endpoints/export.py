@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Flask route for the "export" endpoint
+
+#----- Imports
+from __future__ import annotations
+from typing import Iterator
+
+from flask import Blueprint, request
+
+from app import app, db
+from app.models import (
+    Company, Unit, Team, User, Right, Software, UserRight
+)
+
+from app.helpers import (
+    authenticate, Validator, HTTPResponse, Serializer
+)
+
+
+#----- Globals
+blueprint = Blueprint('export', __name__, url_prefix="/export")
+
+# valid routes for this blueprint
+ROUTE_1=""
+
+# exported tables, in the order they are streamed
+TABLES = [
+    ("companies", Company, [ Company.id, Company.name ]),
+    ("units", Unit, [ Unit.id, Unit.name, Unit.company_id ]),
+    ("teams", Team, [ Team.id, Team.name, Team.unit_id ]),
+    ("users", User, [ User.id, User.name, User.email, User.team_id ]),
+    ("rights", Right, [ Right.id, Right.name, Right.team_id ]),
+    ("software", Software, [ Software.id, Software.name, Software.apikey, Software.team_id ]),
+    ("user-rights", UserRight, [ UserRight.id, UserRight.user_id, UserRight.right_id ])
+]
+
+
+#----- Functions
+
+def rows(start: int, after: int) -> Iterator[bytes]:
+    """Produce one NDJSON line per record
+
+    Args:
+        start: index of the first table to export in TABLES
+        after: ID after which the export of the first table resumes
+
+    Returns:
+        a generator of NDJSON lines
+    """
+    for name, model, columns in TABLES[start:]:
+        query = (db.session
+            .query(*columns)
+            .filter(model.id > after)
+            .order_by(model.id)
+            .execution_options(stream_results=True)
+            .yield_per(app.config['EXPORT_BATCH_SIZE'])
+        )
+
+        for row in query:
+            yield Serializer.dumps({ "table": name, **row._asdict() }) + b"\n"
+
+        # the next tables are exported from the beginning
+        after = 0
+
+#
+# generic routes
+#
+@blueprint.route(ROUTE_1, methods=["GET"])
+@authenticate
+def get_export():
+    """Stream the whole directory as NDJSON
+
+    The export can be resumed with the 'table' and 'after' parameters
+    taken from the last line received.
+
+    Returns:
+        200 OK
+        400 Bad Request
+        500 Internal Server Error
+    """
+    # retrieve the parameters from the request (or set the default value)
+    try:
+        params = Validator.parameters(request, [('table', TABLES[0][0]), ('after', 0)])
+    except ValueError as e:
+        return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
+
+    names = [ name for name, _, _ in TABLES ]
+    if params['table'] not in names:
+        return HTTPResponse.error(0x4004, name='table', type=" | ".join(names))
+
+    try:
+        start = names.index(params['table'])
+        return HTTPResponse.stream(rows(start, abs(params['after'])), "application/x-ndjson")
+
+    except Exception as e:
+        return HTTPResponse.internalError(str(e))
+
+@blueprint.route(ROUTE_1, methods=["POST", "PUT", "DELETE"])
+@authenticate
+def default_export():
+    """Default route for other methods than GET
+
+    Returns:
+        405 Method not allowed
+    """
+    # this line ensures flask does not return errors if data is not purged
+    Validator.body(request)
+    return HTTPResponse.notAllowed("GET")
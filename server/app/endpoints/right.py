@@ -13,15 +13,15 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import List, Optional
+from typing import Optional
 
 from flask import Blueprint, request, url_for
 
-from app import app, db
-from app.models import Team, Right
+from app import db
+from app.models import Team, Right, User, UserRight
 
 from app.helpers import (
-    authenticate, Validator, HTTPResponse, Database
+    authenticate, Validator, HTTPResponse, Database, Paginator, Permission, ETag
 )
 
 
@@ -31,7 +31,7 @@ blueprint = Blueprint('right', __name__, url_prefix="/rights")
 # valid routes for this blueprint
 ROUTE_1=""
 ROUTE_2="/<int:right_id>"
-ROUTE_3="/<int:right_id>/rights"
+ROUTE_3="/<int:right_id>/users"
 
 
 #----- Functions
@@ -48,10 +48,7 @@ def post_right():
         400 Bad Request
         500 Internal Server Error
     """
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -75,6 +72,8 @@ def post_right():
         db.session.add(right)
         db.session.commit()
 
+        Permission.invalidate(team.id)
+
         return HTTPResponse.location(right.id, url_for("right.get_single_right", right_id=right.id))
 
     except Exception as e:
@@ -90,43 +89,33 @@ def get_right():
         400 Bad Request
         500 Internal Server Error
     """
-    # retrieve the parameters from the request (or set the default value)
+    # retrieve the pagination parameters from the request (or set the default value)
     try:
-        params = Validator.parameters(request, [('offset', 0), ('limit', app.config['DEFAULT_LIMIT_VALUE'])])
+        params = Paginator.parameters(request)
     except ValueError as e:
         return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
 
-    # ensure parameters remains positive
-    params['offset'] = abs(params['offset'])
-    params['limit'] = abs(params['limit'])
-
-    if params['limit'] > app.config['MAX_LIMIT_VALUE']:
-        params['limit'] = app.config['MAX_LIMIT_VALUE']
-
     try:
-        # retrieve all the items between the limits
-        items: List[Right] =(db.session
-            .query(Right)
-            .order_by(Right.id)
-            .filter(Right.id >= params['offset'])
-            .limit(params['limit'])
-            .all()
-        )
+        # nothing to send if the table did not change since the last request
+        etag = ETag.table(Right)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # retrieve the items of the page
+        items, page = Paginator.page(db.session.query(Right), Right.id, params)
 
         result = {
-            "offset": params['offset'],
-            "limit": params['limit'],
-            "count": f"{len(items)}",
+            **page,
             "rights": [
                 {
-                    "id": f"{item.id}",
+                    "id": item.id,
                     "name": item.name,
-                    "team_id": f"{item.team_id}"
+                    "team_id": item.team_id
                 } for item in items
             ]
         }
 
-        return HTTPResponse.ok(result)
+        return HTTPResponse.ok(result, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -140,8 +129,7 @@ def put_right():
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("POST, GET, DELETE")
 
 @blueprint.route(ROUTE_1, methods=["DELETE"])
@@ -155,12 +143,8 @@ def delete_right():
         500 Internal Server Error
     """
     try:
-        # retrieve all the existing teams
-        teams: List[Team] = Team.query.order_by(Team.id).all()
-        for team in teams:
-            Database.Delete.Right(None, team.id)
-
-        return HTTPResponse.noContent()
+        # all the records and their descendants, one statement per table and a single commit
+        return Database.Delete.all(Right)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -178,8 +162,7 @@ def post_single_right(right_id):
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("GET, PUT, DELETE")
 
 @blueprint.route(ROUTE_2, methods=["GET"])
@@ -197,11 +180,16 @@ def get_single_right(right_id):
         return HTTPResponse.error(0x4041, rid=right_id, table='Right')
 
     try:
+        # the client already holds this version of the right
+        etag = ETag.row(right)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
         return HTTPResponse.ok({
-            'id': f"{right.id}",
+            'id': right.id,
             'name': right.name,
-            'team_id': f"{right.team_id}"
-        })
+            'team_id': right.team_id
+        }, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -221,10 +209,7 @@ def put_single_right(right_id):
     if not right:
         return HTTPResponse.error(0x4041, rid=right_id, table='Right')
 
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     try:
         for key in data:
@@ -242,6 +227,8 @@ def put_single_right(right_id):
         db.session.add(right)
         db.session.commit()
 
+        Permission.invalidate(right.team_id)
+
         return HTTPResponse.noContent()
 
     except Exception as e:
@@ -267,3 +254,72 @@ def delete_single_right(right_id):
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
+
+
+#
+# routes for the users holding a right
+#
+@blueprint.route(ROUTE_3, methods=["GET"])
+@authenticate
+def get_single_right_users(right_id):
+    """Retrieve all the users holding right_id
+
+    Returns:
+        200 OK
+        400 Bad Request
+        404 Not found
+        500 Internal Server Error
+    """
+    # lookup for the right
+    right: Optional[Right] = Right.query.filter_by(id=right_id).first()
+    if not right:
+        return HTTPResponse.error(0x4041, rid=right_id, table='Right')
+
+    # retrieve the pagination parameters from the request (or set the default value)
+    try:
+        params = Paginator.parameters(request)
+    except ValueError as e:
+        return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
+
+    try:
+        # nothing to send if the tables did not change since the last request
+        etag = ETag.table(User, UserRight)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # the (right_id, user_id) index returns the associations already sorted by user
+        query = (db.session.query(User)
+            .join(UserRight, UserRight.user_id == User.id)
+            .filter(UserRight.right_id == right.id)
+        )
+
+        # retrieve the items of the page
+        items, page = Paginator.page(query, UserRight.user_id, params)
+
+        result = {
+            **page,
+            "users": [
+                {
+                    "id": item.id,
+                    "name": item.name,
+                    "email": item.email
+                } for item in items
+            ]
+        }
+
+        return HTTPResponse.ok(result, etag=etag)
+
+    except Exception as e:
+        return HTTPResponse.internalError(str(e))
+
+@blueprint.route(ROUTE_3, methods=["POST", "PUT", "DELETE"])
+@authenticate
+def default_single_right_users(right_id):
+    """Default route for other methods than GET
+
+    Returns:
+        405 Method not allowed
+    """
+    # this line ensures flask does not return errors if data is not purged
+    Validator.body(request)
+    return HTTPResponse.notAllowed("GET")
@@ -13,16 +13,16 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import List, Optional
+from typing import Optional
 
 from uuid import uuid4
 from flask import Blueprint, request, url_for
 
-from app import app, db
+from app import db
 from app.models import Team, Software, Unit, Company
 
 from app.helpers import (
-    authenticate, Validator, HTTPResponse, Database
+    authenticate, Validator, HTTPResponse, Database, Paginator, Credentials, Token, ETag
 )
 
 
@@ -48,10 +48,7 @@ def post_software():
         400 Bad Request
         500 Internal Server Error
     """
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -90,44 +87,34 @@ def get_software():
         400 Bad Request
         500 Internal Server Error
     """
-    # retrieve the parameters from the request (or set the default value)
+    # retrieve the pagination parameters from the request (or set the default value)
     try:
-        params = Validator.parameters(request, [('offset', 0), ('limit', app.config['DEFAULT_LIMIT_VALUE'])])
+        params = Paginator.parameters(request)
     except ValueError as e:
         return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
 
-    # ensure parameters remains positive
-    params['offset'] = abs(params['offset'])
-    params['limit'] = abs(params['limit'])
-
-    if params['limit'] > app.config['MAX_LIMIT_VALUE']:
-        params['limit'] = app.config['MAX_LIMIT_VALUE']
-
     try:
-        # retrieve all the items between the limits
-        items: List[Software] =(db.session
-            .query(Software)
-            .order_by(Software.id)
-            .filter(Software.id >= params['offset'])
-            .limit(params['limit'])
-            .all()
-        )
+        # nothing to send if the table did not change since the last request
+        etag = ETag.table(Software)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # retrieve the items of the page
+        items, page = Paginator.page(db.session.query(Software), Software.id, params)
 
         result = {
-            "offset": params['offset'],
-            "limit": params['limit'],
-            "count": f"{len(items)}",
+            **page,
             "software": [
                 {
-                    "id": f"{item.id}",
+                    "id": item.id,
                     "name": item.name,
                     "apikey": item.apikey,
-                    "team_id": f"{item.team_id}"
+                    "team_id": item.team_id
                 } for item in items
             ]
         }
 
-        return HTTPResponse.ok(result)
+        return HTTPResponse.ok(result, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -141,8 +128,7 @@ def put_software():
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("POST, GET, DELETE")
 
 @blueprint.route(ROUTE_1, methods=["DELETE"])
@@ -155,12 +141,8 @@ def delete_software():
         500 Internal Server Error
     """
     try:
-        # retrieve all the existing teams
-        teams: List[Team] = Team.query.order_by(Team.id).all()
-        for team in teams:
-            Database.Delete.Software(None, team.id)
-
-        return HTTPResponse.noContent()
+        # all the records and their descendants, one statement per table and a single commit
+        return Database.Delete.all(Software)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -178,8 +160,7 @@ def post_single_software(software_id):
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("GET, PUT, DELETE")
 
 @blueprint.route(ROUTE_2, methods=["GET"])
@@ -197,12 +178,17 @@ def get_single_software(software_id):
         return HTTPResponse.error(0x4041, rid=software_id, table='Software')
 
     try:
+        # the client already holds this version of the software
+        etag = ETag.row(software)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
         return HTTPResponse.ok({
-            'id': f"{software.id}",
+            'id': software.id,
             'name': software.name,
             'apikey': software.apikey,
-            'team_id': f"{software.team_id}"
-        })
+            'team_id': software.team_id
+        }, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -218,10 +204,7 @@ def put_single_software(software_id):
         404 Not Found
         500 Internal Server Error
     """
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # lookup for the software
     software: Optional[Software] = Software.query.filter_by(id=software_id).first()
@@ -271,6 +254,9 @@ def put_single_software(software_id):
         db.session.add(software)
         db.session.commit()
 
+        Credentials.invalidate(software.apikey)
+        Token.revoke(software.id)
+
         return HTTPResponse.noContent()
 
     except Exception as e:
@@ -13,15 +13,15 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import List, Optional
+from typing import Optional
 
 from flask import Blueprint, request, url_for
 
-from app import app, db
+from app import db
 from app.models import Team, Unit, Company
 
 from app.helpers import (
-    authenticate, Validator, HTTPResponse, Database
+    authenticate, Validator, HTTPResponse, Database, Paginator, ETag
 )
 
 
@@ -48,10 +48,7 @@ def post_team():
         404 Not Found
         500 Internal Server Error
     """
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -90,43 +87,33 @@ def get_team():
         400 Bad Request
         500 Internal Server Error
     """
-    # retrieve the parameters from the request (or set the default value)
+    # retrieve the pagination parameters from the request (or set the default value)
     try:
-        params = Validator.parameters(request, [('offset', 0), ('limit', app.config['DEFAULT_LIMIT_VALUE'])])
+        params = Paginator.parameters(request)
     except ValueError as e:
         return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
 
-    # ensure parameters remains positive
-    params['offset'] = abs(params['offset'])
-    params['limit'] = abs(params['limit'])
-
-    if params['limit'] > app.config['MAX_LIMIT_VALUE']:
-        params['limit'] = app.config['MAX_LIMIT_VALUE']
-
     try:
-        # retrieve all the items between the limits
-        items: List[Team] =(db.session
-            .query(Team)
-            .order_by(Team.id)
-            .filter(Team.id >= params['offset'])
-            .limit(params['limit'])
-            .all()
-        )
+        # nothing to send if the table did not change since the last request
+        etag = ETag.table(Team)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # retrieve the items of the page
+        items, page = Paginator.page(db.session.query(Team), Team.id, params)
 
         result = {
-            "offset": params['offset'],
-            "limit": params['limit'],
-            "count": f"{len(items)}",
+            **page,
             "teams": [
                 {
-                    "id": f"{item.id}",
+                    "id": item.id,
                     "name": item.name,
-                    "unit_id": f"{item.unit_id}"
+                    "unit_id": item.unit_id
                 } for item in items
             ]
         }
 
-        return HTTPResponse.ok(result)
+        return HTTPResponse.ok(result, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -140,8 +127,7 @@ def put_team():
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("POST, GET, DELETE")
 
 @blueprint.route(ROUTE_1, methods=["DELETE"])
@@ -155,12 +141,8 @@ def delete_team():
         500 Internal Server Error
     """
     try:
-        # retrieve all the existing units
-        units: List[Unit] = Unit.query.order_by(Unit.id).all()
-        for unit in units:
-            Database.Delete.Team(None, unit.id)
-
-        return HTTPResponse.noContent()
+        # all the records and their descendants, one statement per table and a single commit
+        return Database.Delete.all(Team)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -178,8 +160,7 @@ def post_single_team(team_id):
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("GET, PUT, DELETE")
 
 @blueprint.route(ROUTE_2, methods=["GET"])
@@ -197,11 +178,16 @@ def get_single_team(team_id):
         return HTTPResponse.error(0x4041, rid=team_id, table='Team')
 
     try:
+        # the client already holds this version of the team
+        etag = ETag.row(team)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
         return HTTPResponse.ok({
-            'id': f"{team.id}",
+            'id': team.id,
             'name': team.name,
-            'unit_id': f"{team.unit_id}"
-        })
+            'unit_id': team.unit_id
+        }, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -221,10 +207,7 @@ def put_single_team(team_id):
     if not team:
         return HTTPResponse.error(0x4041, rid=team_id, table='Team')
 
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     try:
         for key in data:
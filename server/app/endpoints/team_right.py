@@ -13,15 +13,15 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import List, Optional
+from typing import Optional
 
 from flask import request, url_for
 
-from app import app, db
+from app import db
 from app.models import Team, Right
 
 from app.helpers import (
-    authenticate, Validator, HTTPResponse, Database
+    authenticate, Validator, HTTPResponse, Database, Paginator, Permission, ETag
 )
 
 from .team import blueprint
@@ -50,10 +50,7 @@ def post_single_team_rights(team_id):
     if not team:
         return HTTPResponse.error(0x4041, rid=team_id, table='Team')
 
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -72,6 +69,8 @@ def post_single_team_rights(team_id):
         db.session.add(right)
         db.session.commit()
 
+        Permission.invalidate(team.id)
+
         return HTTPResponse.location(right.id, url_for('right.get_single_right', right_id=right.id))
 
     except Exception as e:
@@ -92,43 +91,32 @@ def get_single_team_rights(team_id):
     if not team:
         return HTTPResponse.error(0x4041, rid=team_id, table='Team')
 
-    # retrieve the parameters from the request (or set the default value)
+    # retrieve the pagination parameters from the request (or set the default value)
     try:
-        params = Validator.parameters(request, [('offset', 0), ('limit', app.config['DEFAULT_LIMIT_VALUE'])])
+        params = Paginator.parameters(request)
     except ValueError as e:
         return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
 
-    # ensure parameters remains positive
-    params['offset'] = abs(params['offset'])
-    params['limit'] = abs(params['limit'])
-
-    if params['limit'] > app.config['MAX_LIMIT_VALUE']:
-        params['limit'] = app.config['MAX_LIMIT_VALUE']
-
     try:
-        # retrieve all the items between the limits
-        items: List[Right] = (db.session
-            .query(Right)
-            .order_by(Right.id)
-            .filter(Right.team_id == team.id)
-            .filter(Right.id >= params['offset'])
-            .limit(params['limit'])
-            .all()
-        )
+        # nothing to send if the table did not change since the last request
+        etag = ETag.table(Right)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # retrieve the items of the page
+        items, page = Paginator.page(db.session.query(Right).filter(Right.team_id == team.id), Right.id, params)
 
         result = {
-            "offset": params['offset'],
-            "limit": params['limit'],
-            "count": f"{len(items)}",
+            **page,
             "rights": [
                 {
-                    "id": f"{item.id}",
+                    "id": item.id,
                     "name": item.name
                 } for item in items
             ]
         }
 
-        return HTTPResponse.ok(result)
+        return HTTPResponse.ok(result, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -142,8 +130,7 @@ def put_single_team_rights(team_id):
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("POST, GET, DELETE")
 
 @blueprint.route(ROUTE, methods=["DELETE"])
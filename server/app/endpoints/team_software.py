@@ -13,16 +13,16 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import List, Optional
+from typing import Optional
 
 from flask import request, url_for
 from uuid import uuid4
 
-from app import app, db
+from app import db
 from app.models import Team, Software
 
 from app.helpers import (
-    authenticate, Validator, HTTPResponse, Database
+    authenticate, Validator, HTTPResponse, Database, Paginator, ETag
 )
 
 from .team import blueprint
@@ -51,10 +51,7 @@ def post_single_team_software(team_id):
     if not team:
         return HTTPResponse.error(0x4041, rid=team_id, table='Team')
 
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -93,44 +90,33 @@ def get_single_team_software(team_id):
     if not team:
         return HTTPResponse.error(0x4041, rid=team_id, table='Team')
 
-    # retrieve the parameters from the request (or set the default value)
+    # retrieve the pagination parameters from the request (or set the default value)
     try:
-        params = Validator.parameters(request, [('offset', 0), ('limit', app.config['DEFAULT_LIMIT_VALUE'])])
+        params = Paginator.parameters(request)
     except ValueError as e:
         return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
 
-    # ensure parameters remains positive
-    params['offset'] = abs(params['offset'])
-    params['limit'] = abs(params['limit'])
-
-    if params['limit'] > app.config['MAX_LIMIT_VALUE']:
-        params['limit'] = app.config['MAX_LIMIT_VALUE']
-
     try:
-        # retrieve all the items between the limits
-        items: List[Software] = (db.session
-            .query(Software)
-            .order_by(Software.id)
-            .filter(Software.team_id == team.id)
-            .filter(Software.id >= params['offset'])
-            .limit(params['limit'])
-            .all()
-        )
+        # nothing to send if the table did not change since the last request
+        etag = ETag.table(Software)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # retrieve the items of the page
+        items, page = Paginator.page(db.session.query(Software).filter(Software.team_id == team.id), Software.id, params)
 
         result = {
-            "offset": params['offset'],
-            "limit": params['limit'],
-            "count": f"{len(items)}",
+            **page,
             "software": [
                 {
-                    "id": f"{item.id}",
+                    "id": item.id,
                     "name": item.name,
                     "apikey": item.apikey
                 } for item in items
             ]
         }
 
-        return HTTPResponse.ok(result)
+        return HTTPResponse.ok(result, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -144,8 +130,7 @@ def put_single_team_software(team_id):
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("POST, GET, DELETE")
 
 @blueprint.route(ROUTE, methods=["DELETE"])
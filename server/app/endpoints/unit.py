@@ -13,15 +13,15 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import List, Optional
+from typing import Optional
 
 from flask import Blueprint, request, url_for
 
-from app import app, db
+from app import db
 from app.models import Company, Team, Unit
 
 from app.helpers import (
-    authenticate, Validator, HTTPResponse, Database
+    authenticate, Validator, HTTPResponse, Database, Paginator, ETag
 )
 
 
@@ -49,10 +49,7 @@ def post_unit():
         404 Not found
         500 Internal Server Error
     """
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -91,43 +88,34 @@ def get_unit():
         400 Bad Request
         500 Internal Server Error
     """
-    # retrieve the parameters from the request (or set the default value)
+    # retrieve the pagination parameters from the request (or set the default value)
     try:
-        params = Validator.parameters(request, [('offset', 0), ('limit', app.config['DEFAULT_LIMIT_VALUE'])])
+        params = Paginator.parameters(request)
     except ValueError as e:
         return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
 
-    # ensure parameters remains positive
-    params['offset'] = abs(params['offset'])
-    params['limit'] = abs(params['limit'])
-
-    if params['limit'] > app.config['MAX_LIMIT_VALUE']:
-        params['limit'] = app.config['MAX_LIMIT_VALUE']
-
     try:
-        items: List[Unit] = (db.session
-            .query(Unit)
-            .order_by(Unit.id)
-            .filter(Unit.id >= params['offset'])
-            .limit(params['limit'])
-            .all()
-        )
+        # nothing to send if the table did not change since the last request
+        etag = ETag.table(Unit)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # retrieve the items of the page
+        items, page = Paginator.page(db.session.query(Unit), Unit.id, params)
 
         # build the result dictionary
         result = {
-            'offset': params['offset'],
-            'limit': params['limit'],
-            "count": f"{len(items)}",
+            **page,
             'units': [
                 {
-                'id': f"{item.id}",
+                'id': item.id,
                 'name': item.name,
-                'company_id': f"{item.company_id}"
+                'company_id': item.company_id
                 } for item in items
             ]
         }
 
-        return HTTPResponse.ok(result)
+        return HTTPResponse.ok(result, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -141,8 +129,7 @@ def put_unit():
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("POST, GET, DELETE")
 
 @blueprint.route(ROUTE_1, methods=["DELETE"])
@@ -155,12 +142,8 @@ def delete_unit():
         500 Internal Server Error
     """
     try:
-        # retrieve all the existing companies
-        companies: List[Company] = Company.query.order_by(Company.id).all()
-        for company in companies:
-            Database.Delete.Unit(None, company.id)
-
-        return HTTPResponse.noContent()
+        # all the records and their descendants, one statement per table and a single commit
+        return Database.Delete.all(Unit)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -178,8 +161,7 @@ def post_single_unit(unit_id):
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("GET, PUT, DELETE")
 
 @blueprint.route(ROUTE_2, methods=["GET"])
@@ -197,11 +179,16 @@ def get_single_unit(unit_id):
         return HTTPResponse.error(0x4041, rid=unit_id, table='Unit')
 
     try:
+        # the client already holds this version of the unit
+        etag = ETag.row(unit)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
         return HTTPResponse.ok({
-            'id': f"{unit.id}",
+            'id': unit.id,
             'name': unit.name,
-            'company_id': f"{unit.company_id}"
-        })
+            'company_id': unit.company_id
+        }, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -221,10 +208,7 @@ def put_single_unit(unit_id):
     if not unit:
         return HTTPResponse.error(0x4041, rid=unit_id, table='Unit')
 
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     try:
         for key in data:
@@ -287,10 +271,7 @@ def post_single_unit_teams(unit_id):
     if not unit:
         return HTTPResponse.error(0x4041, rid=unit_id, table='Unit')
 
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -328,43 +309,32 @@ def get_single_unit_teams(unit_id):
     if not unit:
         return HTTPResponse.error(0x4041, rid=unit_id, table='Unit')
 
-    # retrieve the parameters from the request (or set the default value)
+    # retrieve the pagination parameters from the request (or set the default value)
     try:
-        params = Validator.parameters(request, [('offset', 0), ('limit', app.config['DEFAULT_LIMIT_VALUE'])])
+        params = Paginator.parameters(request)
     except ValueError as e:
         return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
 
-    # ensure parameters remains positive
-    params['offset'] = abs(params['offset'])
-    params['limit'] = abs(params['limit'])
-
-    if params['limit'] > app.config['MAX_LIMIT_VALUE']:
-        params['limit'] = app.config['MAX_LIMIT_VALUE']
-
     try:
-        # retrieve all the items between the limits
-        items: List[Team] =(db.session
-            .query(Team)
-            .order_by(Team.id)
-            .filter(Team.unit_id == unit.id)
-            .filter(Team.id >= params['offset'])
-            .limit(params['limit'])
-            .all()
-        )
+        # nothing to send if the table did not change since the last request
+        etag = ETag.table(Team)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # retrieve the items of the page
+        items, page = Paginator.page(db.session.query(Team).filter(Team.unit_id == unit.id), Team.id, params)
 
         result = {
-            "offset": params['offset'],
-            "limit": params['limit'],
-            "count": f"{len(items)}",
+            **page,
             "teams": [
                 {
-                    "id": f"{item.id}",
+                    "id": item.id,
                     "name": item.name
                 } for item in items
             ]
         }
 
-        return HTTPResponse.ok(result)
+        return HTTPResponse.ok(result, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -380,8 +350,7 @@ def put_single_unit_teams(unit_id):
         500 Internal Server Error
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("POST, GET, DELETE")
 
 @blueprint.route(ROUTE_3, methods=["DELETE"])
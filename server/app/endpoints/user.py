@@ -13,15 +13,15 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import List, Optional
+from typing import Optional
 
 from flask import Blueprint, request, url_for
 
-from app import app, db
-from app.models import Team, User, Unit, Company
+from app import db
+from app.models import Team, User, Unit, Company, Right, UserRight
 
 from app.helpers import (
-    authenticate, Validator, HTTPResponse, Database
+    authenticate, Validator, HTTPResponse, Database, Paginator, Permission, ETag
 )
 
 
@@ -49,10 +49,7 @@ def post_user():
         404 Not Found
         500 Internal Server Error
     """
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -76,6 +73,8 @@ def post_user():
         db.session.add(user)
         db.session.commit()
 
+        Permission.invalidate(team.id)
+
         return HTTPResponse.location(user.id, url_for("user.get_single_user", user_id=user.id))
 
     except Exception as e:
@@ -91,44 +90,34 @@ def get_user():
         400 Bad Request
         500 Internal Server Error
     """
-    # retrieve the parameters from the request (or set the default value)
+    # retrieve the pagination parameters from the request (or set the default value)
     try:
-        params = Validator.parameters(request, [('offset', 0), ('limit', app.config['DEFAULT_LIMIT_VALUE'])])
+        params = Paginator.parameters(request)
     except ValueError as e:
         return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
 
-    # ensure parameters remains positive
-    params['offset'] = abs(params['offset'])
-    params['limit'] = abs(params['limit'])
-
-    if params['limit'] > app.config['MAX_LIMIT_VALUE']:
-        params['limit'] = app.config['MAX_LIMIT_VALUE']
-
     try:
-        # retrieve all the items between the limits
-        items: List[User] =(db.session
-            .query(User)
-            .order_by(User.id)
-            .filter(User.id >= params['offset'])
-            .limit(params['limit'])
-            .all()
-        )
+        # nothing to send if the table did not change since the last request
+        etag = ETag.table(User)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # retrieve the items of the page
+        items, page = Paginator.page(db.session.query(User), User.id, params)
 
         result = {
-            "offset": params['offset'],
-            "limit": params['limit'],
-            "count": f"{len(items)}",
+            **page,
             "users": [
                 {
-                    "id": f"{item.id}",
+                    "id": item.id,
                     "name": item.name,
                     "email": item.email,
-                    "team_id": f"{item.team_id}"
+                    "team_id": item.team_id
                 } for item in items
             ]
         }
 
-        return HTTPResponse.ok(result)
+        return HTTPResponse.ok(result, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -142,8 +131,7 @@ def put_user():
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("POST, GET, DELETE")
 
 @blueprint.route(ROUTE_1, methods=["DELETE"])
@@ -157,12 +145,8 @@ def delete_user():
         500 Internal Server Error
     """
     try:
-        # retrieve all the existing teams
-        teams: List[Team] = Team.query.order_by(Team.id).all()
-        for team in teams:
-            Database.Delete.User(None, team.id)
-
-        return HTTPResponse.noContent()
+        # all the records and their descendants, one statement per table and a single commit
+        return Database.Delete.all(User)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -180,8 +164,7 @@ def post_single_user(user_id):
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("GET, PUT, DELETE")
 
 @blueprint.route(ROUTE_2, methods=["GET"])
@@ -199,12 +182,17 @@ def get_single_user(user_id):
         return HTTPResponse.error(0x4041, rid=user_id, table='User')
 
     try:
+        # the client already holds this version of the user
+        etag = ETag.row(user)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
         return HTTPResponse.ok({
-            'id': f"{user.id}",
+            'id': user.id,
             'name': user.name,
             'email': user.email,
-            'team_id': f"{user.team_id}"
-        })
+            'team_id': user.team_id
+        }, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -224,12 +212,12 @@ def put_single_user(user_id):
     if not user:
         return HTTPResponse.error(0x4041, rid=user_id, table='User')
 
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     try:
+        # keep the initial team to invalidate its cached decisions
+        team_id = user.team_id
+
         for key in data:
             if key not in [ 'name', 'email', 'team_id' ]:
                 return HTTPResponse.error(0x4005, name=key)
@@ -277,6 +265,9 @@ def put_single_user(user_id):
         db.session.add(user)
         db.session.commit()
 
+        Permission.invalidate(team_id)
+        Permission.invalidate(user.team_id)
+
         return HTTPResponse.noContent()
 
     except Exception as e:
@@ -302,3 +293,52 @@ def delete_single_user(user_id):
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
+
+
+#
+# routes for the rights of a user
+#
+@blueprint.route(ROUTE_3, methods=["GET"])
+@authenticate
+def get_single_user_rights(user_id):
+    """Retrieve the names of all the rights granted to a user
+
+    Returns:
+        200 OK
+        404 Not found
+        500 Internal Server Error
+    """
+    # lookup for the user
+    user: Optional[User] = User.query.filter_by(id=user_id).first()
+    if not user:
+        return HTTPResponse.error(0x4041, rid=user_id, table='User')
+
+    try:
+        # the rights change with the users, the rights and the associations
+        etag = ETag.table(User, Right, UserRight)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        # read after the tag, and not from the caches of this worker, so the body is never older than the tag
+        rights = Permission.lookupRights(user.team_id, user.email) or []
+
+        return HTTPResponse.ok({
+            "id": user.id,
+            "team_id": user.team_id,
+            "rights": rights
+        }, etag=etag)
+
+    except Exception as e:
+        return HTTPResponse.internalError(str(e))
+
+@blueprint.route(ROUTE_3, methods=["POST", "PUT", "DELETE"])
+@authenticate
+def default_single_user_rights(user_id):
+    """Default route for other methods than GET
+
+    Returns:
+        405 Method not allowed
+    """
+    # this line ensures flask does not return errors if data is not purged
+    Validator.body(request)
+    return HTTPResponse.notAllowed("GET")
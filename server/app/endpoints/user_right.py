@@ -13,17 +13,17 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import List, Optional
+from typing import Optional
 
 from flask import Blueprint, request, url_for
 
-from app import app, db
+from app import db
 from app.models import (
     User, Right, UserRight
 )
 
 from app.helpers import (
-    authenticate, Validator, HTTPResponse, Database
+    authenticate, Validator, HTTPResponse, Database, Paginator, Permission, ETag
 )
 
 
@@ -50,10 +50,7 @@ def post_userright():
         404 Not Found
         500 Internal Server Error
     """
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -83,6 +80,8 @@ def post_userright():
         db.session.add(user_right)
         db.session.commit()
 
+        Permission.invalidate(user.team_id)
+
         return HTTPResponse.location(user_right.id, url_for('user_right.get_single_userright', user_right_id=user_right.id))
 
     except Exception as e:
@@ -98,43 +97,42 @@ def get_userright():
         400 Bad Request
         500 Internal Server Error
     """
-    # retrieve the parameters from the request (or set the default value)
+    # retrieve the pagination parameters and the filters from the request (or set the default value)
     try:
-        params = Validator.parameters(request, [('offset', 0), ('limit', app.config['DEFAULT_LIMIT_VALUE'])])
+        params = Paginator.parameters(request)
+        filters = Validator.parameters(request, [('user_id', 0), ('right_id', 0), ('team_id', 0)])
     except ValueError as e:
         return HTTPResponse.error(0x4004, name=e.args[0][0], type=e.args[0][1])
 
-    # ensure parameters remains positive
-    params['offset'] = abs(params['offset'])
-    params['limit'] = abs(params['limit'])
-
-    if params['limit'] > app.config['MAX_LIMIT_VALUE']:
-        params['limit'] = app.config['MAX_LIMIT_VALUE']
-
     try:
-        # retrieve all the items between the limits
-        items: List[UserRight] =(db.session
-            .query(UserRight)
-            .order_by(UserRight.id)
-            .filter(UserRight.id >= params['offset'])
-            .limit(params['limit'])
-            .all()
-        )
+        # nothing to send if the tables did not change since the last request
+        etag = ETag.table(UserRight, Right) if filters['team_id'] else ETag.table(UserRight)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
+        query = db.session.query(UserRight)
+        if filters['user_id']:
+            query = query.filter(UserRight.user_id == filters['user_id'])
+        if filters['right_id']:
+            query = query.filter(UserRight.right_id == filters['right_id'])
+        if filters['team_id']:
+            query = query.join(Right, Right.id == UserRight.right_id).filter(Right.team_id == filters['team_id'])
+
+        # retrieve the items of the page
+        items, page = Paginator.page(query, UserRight.id, params)
 
         result = {
-            "offset": params['offset'],
-            "limit": params['limit'],
-            "count": f"{len(items)}",
+            **page,
             "user-rights": [
                 {
-                    "id": f"{item.id}",
-                    "user_id": f"{item.user_id}",
-                    "right_id": f"{item.right_id}"
+                    "id": item.id,
+                    "user_id": item.user_id,
+                    "right_id": item.right_id
                 } for item in items
             ]
         }
 
-        return HTTPResponse.ok(result)
+        return HTTPResponse.ok(result, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -148,8 +146,7 @@ def put_userright():
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("POST, GET, DELETE")
 
 @blueprint.route(ROUTE_1, methods=["DELETE"])
@@ -163,12 +160,8 @@ def delete_userright():
         500 Internal Server Error
     """
     try:
-        # retrieve all the items
-        items: List[UserRight] = UserRight.query.order_by(UserRight.id).all()
-        for item in items:
-            Database.Delete.UserRight(usrg_id=item.id)
-
-        return HTTPResponse.noContent()
+        # all the records and their descendants, one statement per table and a single commit
+        return Database.Delete.all(UserRight)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -186,8 +179,7 @@ def post_single_userright(user_right_id):
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
     return HTTPResponse.notAllowed("PUT, GET, DELETE")
 
 @blueprint.route(ROUTE_2, methods=["GET"])
@@ -206,11 +198,16 @@ def get_single_userright(user_right_id):
         return HTTPResponse.error(0x4041, rid=user_right_id, table='UserRight')
 
     try:
+        # the client already holds this version of the association
+        etag = ETag.row(usrg)
+        if ETag.matches(etag):
+            return HTTPResponse.notModified(etag)
+
         return HTTPResponse.ok({
-            'id': f"{usrg.id}",
-            'user_id': f"{usrg.user_id}",
-            'right_id': f"{usrg.right_id}"
-        })
+            'id': usrg.id,
+            'user_id': usrg.user_id,
+            'right_id': usrg.right_id
+        }, etag=etag)
 
     except Exception as e:
         return HTTPResponse.internalError(str(e))
@@ -230,10 +227,7 @@ def put_single_userright(user_right_id):
     if not usrg:
         return HTTPResponse.error(0x4041, rid=user_right_id, table='UserRight')
 
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     try:
         for key in data:
@@ -277,6 +271,10 @@ def put_single_userright(user_right_id):
         db.session.add(usrg)
         db.session.commit()
 
+        # both user and right belong to the same team
+        user: User = User.query.filter_by(id=usrg.user_id).first()
+        Permission.invalidate(user.team_id)
+
         return HTTPResponse.noContent()
 
     except Exception as e:
@@ -13,7 +13,6 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import Optional
 
 import jwt
 import datetime
@@ -21,12 +20,9 @@ import datetime
 from flask import Blueprint, request
 
 from app import app
-from app.models import (
-    User, Right, UserRight
-)
 
 from app.helpers import (
-    Validator, HTTPResponse
+    authenticate, Validator, HTTPResponse, Permission, Token, Credentials
 )
 
 from app.localization import getMessage
@@ -35,6 +31,19 @@ from app.localization import getMessage
 #----- Globals
 blueprint = Blueprint("validation", __name__, url_prefix="/validate")
 
+# valid routes for this blueprint
+ROUTE_1=""
+ROUTE_2="/stats"
+ROUTE_3="/batch"
+ROUTE_4="/rights"
+
+# HTTP codes corresponding to the result of a permission check
+RESULT_CODES = {
+    Permission.GRANTED: "200",
+    Permission.UNKNOWN: "401",
+    Permission.DENIED: "403"
+}
+
 
 #----- Functions
 
@@ -42,7 +51,7 @@ blueprint = Blueprint("validation", __name__, url_prefix="/validate")
 # generic routes
 #
 
-@blueprint.route("", methods=["POST"])
+@blueprint.route(ROUTE_1, methods=["POST"])
 def post_validate():
     """Validate a user/right request for a particular application
 
@@ -54,10 +63,7 @@ def post_validate():
         500 Internal Server Error
     """
     # retrieve the data if any
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        data = request.get_json()
-    else:
-        data = {}
+    data = Validator.body(request)
 
     # check parameters
     try:
@@ -65,37 +71,35 @@ def post_validate():
     except KeyError as e:
         return HTTPResponse.error(0x4001, name=str(e))
 
+    # the email and the right are looked up as strings
+    for field in [ 'email', 'right' ]:
+        if not isinstance(data[field], str):
+            return HTTPResponse.error(0x4004, name=field, type='string')
+
     try:
         # retrieve the data contained in the token
-        token = jwt.decode(data['token'], app.config['DUDE_SECRET_KEY'], "HS256")
+        token = Token.decode(data['token'])
 
         # validate expiry date
         now = datetime.datetime.utcnow().timestamp()
         if token['exp'] < now:
             return HTTPResponse.error(0x4010)
 
-        # retrieve the user
-        user: Optional[User] = User.query.filter_by(email=data['email'], team_id=token['team_id']).first()
-        if not user:
-            return HTTPResponse.error(0x4011)
-
-        # retrieve the right
-        right: Optional[Right] = Right.query.filter_by(name=data['right'], team_id=token['team_id']).first()
-        if not right:
-            return HTTPResponse.error(0x4011)
-
-        # lookup for the association
-        user_right: Optional[UserRight] = UserRight.query.filter_by(user_id=user.id, right_id=right.id).first()
-        if not user_right:
-            return HTTPResponse.error(0x4030)
+        # lookup for the user / right association
+        result = Permission.check(token['team_id'], data['email'], data['right'])
+        if result != Permission.GRANTED:
+            return HTTPResponse.error(result)
         else:
             return HTTPResponse.ok({ "message": getMessage(0x2000) })
 
+    except jwt.ExpiredSignatureError:
+        return HTTPResponse.error(0x4010)
+
     except Exception as e:
         return HTTPResponse.internalError(str(e))
 
 
-@blueprint.route("", methods=["GET", "PUT", "DELETE"])
+@blueprint.route(ROUTE_1, methods=["GET", "PUT", "DELETE"])
 def default_validate():
     """Default route for other methods than POST
 
@@ -103,6 +107,191 @@ def default_validate():
         405 Method not allowed
     """
     # this line ensures flask does not return errors if data is not purged
-    if int(request.headers.get('Content-Length', 0)) > 0:
-        request.get_json()
+    Validator.body(request)
+    return HTTPResponse.notAllowed("POST")
+
+
+#
+# routes for batch validation
+#
+@blueprint.route(ROUTE_3, methods=["POST"])
+def post_validate_batch():
+    """Validate a list of user/right requests for a particular application
+
+    Returns:
+        200 OK
+        400 Bad Request
+        401 Unauthorized/Unauthenticated
+        500 Internal Server Error
+    """
+    # retrieve the data if any
+    data = Validator.body(request)
+
+    # check parameters
+    try:
+        Validator.data(data, [ 'token', 'checks' ])
+    except KeyError as e:
+        return HTTPResponse.error(0x4001, name=str(e))
+
+    if not isinstance(data['checks'], list):
+        return HTTPResponse.error(0x4004, name='checks', type='list')
+
+    if len(data['checks']) > app.config['MAX_BATCH_SIZE']:
+        return HTTPResponse.error(0x4007, name='checks', max=app.config['MAX_BATCH_SIZE'])
+
+    # each check is an object with the email and the right as strings
+    for item in data['checks']:
+        if not isinstance(item, dict):
+            return HTTPResponse.error(0x4004, name='checks', type='list of objects')
+
+        try:
+            Validator.data(item, [ 'email', 'right' ])
+        except KeyError as e:
+            return HTTPResponse.error(0x4001, name=str(e))
+
+        for field in [ 'email', 'right' ]:
+            if not isinstance(item[field], str):
+                return HTTPResponse.error(0x4004, name=field, type='string')
+
+    try:
+        # retrieve the data contained in the token
+        token = Token.decode(data['token'])
+
+        # validate expiry date
+        now = datetime.datetime.utcnow().timestamp()
+        if token['exp'] < now:
+            return HTTPResponse.error(0x4010)
+
+        # lookup for all the user / right associations at once
+        pairs = [ (item['email'], item['right']) for item in data['checks'] ]
+        results = Permission.checkMany(token['team_id'], pairs)
+
+        return HTTPResponse.ok({
+            "count": len(results),
+            "results": [
+                {
+                    "email": email,
+                    "right": right,
+                    "authorized": result == Permission.GRANTED,
+                    "code": RESULT_CODES[result],
+                    "message": getMessage(result)
+                } for (email, right), result in zip(pairs, results)
+            ]
+        })
+
+    except jwt.ExpiredSignatureError:
+        return HTTPResponse.error(0x4010)
+
+    except Exception as e:
+        return HTTPResponse.internalError(str(e))
+
+@blueprint.route(ROUTE_3, methods=["GET", "PUT", "DELETE"])
+def default_validate_batch():
+    """Default route for other methods than POST
+
+    Returns:
+        405 Method not allowed
+    """
+    # this line ensures flask does not return errors if data is not purged
+    Validator.body(request)
+    return HTTPResponse.notAllowed("POST")
+
+
+#
+# routes for the effective rights
+#
+@blueprint.route(ROUTE_4, methods=["POST"])
+def post_validate_rights():
+    """Retrieve all the rights of a user for a particular application
+
+    The client can keep the list for the duration of a session and decide locally.
+
+    Returns:
+        200 OK
+        400 Bad Request
+        401 Unauthorized/Unauthenticated
+        500 Internal Server Error
+    """
+    # retrieve the data if any
+    data = Validator.body(request)
+
+    # check parameters
+    try:
+        Validator.data(data, [ 'token', 'email' ])
+    except KeyError as e:
+        return HTTPResponse.error(0x4001, name=str(e))
+
+    # the email is looked up as a string
+    if not isinstance(data['email'], str):
+        return HTTPResponse.error(0x4004, name='email', type='string')
+
+    try:
+        # retrieve the data contained in the token
+        token = Token.decode(data['token'])
+
+        # validate expiry date
+        now = datetime.datetime.utcnow().timestamp()
+        if token['exp'] < now:
+            return HTTPResponse.error(0x4010)
+
+        # all the rights of the user within the team of the application
+        rights = Permission.rights(token['team_id'], data['email'])
+        if rights is None:
+            return HTTPResponse.error(Permission.UNKNOWN)
+
+        return HTTPResponse.ok({
+            "email": data['email'],
+            "rights": rights
+        })
+
+    except jwt.ExpiredSignatureError:
+        return HTTPResponse.error(0x4010)
+
+    except Exception as e:
+        return HTTPResponse.internalError(str(e))
+
+@blueprint.route(ROUTE_4, methods=["GET", "PUT", "DELETE"])
+def default_validate_rights():
+    """Default route for other methods than POST
+
+    Returns:
+        405 Method not allowed
+    """
+    # this line ensures flask does not return errors if data is not purged
+    Validator.body(request)
     return HTTPResponse.notAllowed("POST")
+
+
+#
+# routes for the statistics
+#
+@blueprint.route(ROUTE_2, methods=["GET"])
+@authenticate
+def get_validate_stats():
+    """Retrieve the counters of the permission caches
+
+    Returns:
+        200 OK
+        500 Internal Server Error
+    """
+    try:
+        stats = Permission.stats()
+        stats['tokens'] = Token.stats()
+        stats['software'] = Credentials.stats()
+
+        return HTTPResponse.ok(stats)
+
+    except Exception as e:
+        return HTTPResponse.internalError(str(e))
+
+@blueprint.route(ROUTE_2, methods=["POST", "PUT", "DELETE"])
+@authenticate
+def default_validate_stats():
+    """Default route for other methods than GET
+
+    Returns:
+        405 Method not allowed
+    """
+    # this line ensures flask does not return errors if data is not purged
+    Validator.body(request)
+    return HTTPResponse.notAllowed("GET")
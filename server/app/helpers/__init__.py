@@ -1,4 +1,9 @@
 from .basic import authenticate
 from .validator import Validator
-from .http_response import HTTPResponse
+from .http_response import HTTPResponse, Serializer
+from .credentials import Credentials
 from .database import Database
+from .permission import Permission
+from .token import Token
+from .paginator import Paginator
+from .etag import ETag
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Per-team Bloom filters of the known emails and right names
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Optional
+
+import hashlib
+import math
+import time
+
+from sqlalchemy import select
+
+from app import app, db
+from app.models import (
+    User, Right
+)
+
+from .cache import Generations
+from .flight import SingleFlight
+
+
+#----- Globals
+# filter of each team indexed by team_id
+teams: Dict[int, BloomFilter] = {}
+
+# counters of the answers of the filters
+answers: Dict[str, int] = { "rejected": 0, "passed": 0, "false_positives": 0 }
+
+# concurrent builds of the same team share one execution
+flights = SingleFlight()
+
+# a build which started before an invalidation of its team is not stored
+generations = Generations()
+
+
+#----- Class
+class BloomFilter:
+    """Set membership with false positives but no false negatives"""
+
+    __slots__ = ("bits", "size", "hashes", "count", "version", "expiry")
+
+    def __init__(self, items: Iterable[bytes], count: int, rate: float, version: int, expiry: float) -> None:
+        """Constructor
+
+        Args:
+            items: the members of the set
+            count: the number of members
+            rate: the expected false-positive rate
+            version: version of the team read before the build
+            expiry: monotonic time after which the filter is rebuilt
+        """
+        # optimal number of bits and of hash functions for this rate
+        self.size = max(64, math.ceil(-max(count, 1) * math.log(rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / max(count, 1) * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = count
+        self.version = version
+        self.expiry = expiry
+
+        for item in items:
+            for position in self.positions(item):
+                self.bits[position >> 3] |= 1 << (position & 7)
+
+    def positions(self, item: bytes) -> Iterable[int]:
+        """Return the bits of an item (double hashing of a 128 bits digest)"""
+        value = hashlib.blake2b(item, digest_size=16).digest()
+        first = int.from_bytes(value[:8], "little")
+        second = int.from_bytes(value[8:], "little") | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def __contains__(self, item: bytes) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+    def rate(self) -> float:
+        """Return the estimated false-positive rate for the current number of members"""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class Bloom:
+    """Helper class to reject the emails and rights unknown to a team without a query"""
+
+    @staticmethod
+    def build(team_id: int, version: int) -> BloomFilter:
+        """Build the filter of a team from its emails and right names"""
+        emails = db.session.execute(select(User.email).where(User.team_id == team_id)).scalars().all()
+        rights = db.session.execute(select(Right.name).where(Right.team_id == team_id)).scalars().all()
+
+        items = [ b"e:" + email.encode() for email in emails ] + [ b"r:" + name.encode() for name in rights ]
+        return BloomFilter(items, len(items), app.config['PERMISSION_BLOOM_FP_RATE'],
+                           version, time.monotonic() + app.config['PERMISSION_CACHE_TTL'])
+
+    @staticmethod
+    def team(team_id: int, version: int) -> BloomFilter:
+        """Retrieve the filter of a team, (re)built if missing, expired or older than the team"""
+        bloom = teams.get(team_id)
+        if (bloom is None) or (bloom.version != version) or (bloom.expiry < time.monotonic()):
+            generation = generations.get(team_id)
+            bloom = flights.do((team_id, version), lambda: Bloom.build(team_id, version))
+            if generations.get(team_id) == generation:
+                teams[team_id] = bloom
+
+        return bloom
+
+    @staticmethod
+    def reject(team_id: int, version: int, email: str, right: Optional[str] = None) -> bool:
+        """Check if the email, or the right, is certainly unknown to a team
+
+        Args:
+            team_id: ID of the team
+            version: current version of the team
+            email: email of the user
+            right: name of the right (not checked if None)
+
+        Returns:
+            True if the user or the right does not exist, False if they may exist
+        """
+        if not app.config['PERMISSION_BLOOM_FP_RATE']:
+            return False
+
+        bloom = Bloom.team(team_id, version)
+        if (b"e:" + email.encode() not in bloom) or ((right is not None) and (b"r:" + right.encode() not in bloom)):
+            answers["rejected"] += 1
+            return True
+
+        answers["passed"] += 1
+        return False
+
+    @staticmethod
+    def falsePositive() -> None:
+        """Count a lookup let through by a filter which found no user or no right"""
+        if app.config['PERMISSION_BLOOM_FP_RATE']:
+            answers["false_positives"] += 1
+
+    @staticmethod
+    def invalidate(team_id: Optional[int] = None) -> None:
+        """Drop the filter of a team after a write, it is rebuilt on the next check
+
+        Args:
+            team_id: ID of the team whose users/rights changed, all the teams if None
+        """
+        generations.bump(team_id)
+        flights.forget()
+        if team_id is None:
+            teams.clear()
+        else:
+            teams.pop(team_id, None)
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        """Return the size of the filters and the counters of their answers"""
+        filters = list(teams.values())
+        items = sum(bloom.count for bloom in filters)
+        negatives = answers["rejected"] + answers["false_positives"]
+
+        return {
+            "teams": len(filters),
+            "items": items,
+            "bytes": sum(len(bloom.bits) for bloom in filters),
+            "estimated_fp_rate": (sum(bloom.rate() * bloom.count for bloom in filters) / items) if items else 0.0,
+            "observed_fp_rate": (answers["false_positives"] / negatives) if negatives else 0.0,
+            **answers,
+            "flights": flights.stats()
+        }
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Bounded in-process LRU cache with expiry
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import time
+import threading
+
+from collections import OrderedDict
+
+
+#----- Class
+class LRUCache:
+    """Thread-safe LRU cache with a time-to-live on each entry"""
+
+    # sentinel returned when a key is not in the cache
+    MISSING = object()
+
+    def __init__(self, size: int, ttl: float) -> None:
+        """Constructor
+
+        Args:
+            size: maximum number of entries (0 disables the cache)
+            ttl: default time-to-live of an entry in seconds
+        """
+        self.size = size
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._items: OrderedDict[Hashable, Any] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Retrieve a value from the cache
+
+        Args:
+            key: the key of the entry
+
+        Returns:
+            the value, or LRUCache.MISSING if the key is absent or expired
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return LRUCache.MISSING
+
+            expiry, value = item
+            if expiry < time.monotonic():
+                del self._items[key]
+                self.misses += 1
+                return LRUCache.MISSING
+
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value in the cache
+
+        Args:
+            key: the key of the entry
+            value: the value to store
+            ttl: time-to-live for this entry (default to the cache ttl)
+        """
+        if self.size <= 0:
+            return
+
+        expiry = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._items[key] = (expiry, value)
+            self._items.move_to_end(key)
+
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """Remove an entry from the cache if present"""
+        with self._lock:
+            self._items.pop(key, None)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> None:
+        """Remove all the entries matching a predicate
+
+        Args:
+            predicate: function called with each key, all the entries are removed if None
+        """
+        with self._lock:
+            if predicate is None:
+                self._items.clear()
+                return
+
+            for key in [ key for key in self._items if predicate(key) ]:
+                del self._items[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Return the counters of the cache"""
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "max_size": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+class Generations:
+    """Generation numbers bumped on each invalidation, per key and for all the keys
+
+    A value computed from the database is only stored if the generation of
+    its key did not change in the meantime, so a lookup which started before
+    a write cannot overwrite the invalidation of that write.
+    """
+
+    def __init__(self) -> None:
+        """Constructor"""
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._items: Dict[Hashable, int] = {}
+
+    def get(self, key: Hashable) -> Tuple[int, int]:
+        """Return the current generation of a key"""
+        return (self._epoch, self._items.get(key, 0))
+
+    def bump(self, key: Optional[Hashable] = None) -> None:
+        """Start a new generation for a key, or for all the keys if None"""
+        with self._lock:
+            if key is None:
+                self._epoch += 1
+            else:
+                self._items[key] = self._items.get(key, 0) + 1
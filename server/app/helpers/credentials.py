@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Class to authenticate the software with their apikey
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Dict, Optional
+
+from app import app, db
+from app.models import Software
+
+from .cache import LRUCache
+from .etag import ETag
+from .flight import SingleFlight
+
+
+#----- Globals
+# recently authenticated software indexed by the digest of their apikey, with the change counter of the table
+softwares = LRUCache(app.config['CREDENTIALS_CACHE_SIZE'], app.config['CREDENTIALS_CACHE_TTL'])
+
+# concurrent lookups of the same apikey share one query
+flights = SingleFlight()
+
+
+#----- Class
+class Credentials:
+    """Helper class to look up a software from its name and apikey"""
+
+    @staticmethod
+    def lookup(name: str, apikey: str) -> Optional[Any]:
+        """Retrieve a software from its credentials
+
+        The software is searched by the digest of its apikey only and kept in
+        the cache of this worker with the change counter of the software
+        table: once any worker changed, moved or deleted a software, the row
+        is read again. Concurrent misses for the same apikey wait for a
+        single query.
+
+        Args:
+            name: the name of the software
+            apikey: the apikey of the software
+
+        Returns:
+            a row with the id, name, apikey and team_id of the software, None if the credentials are not valid
+        """
+        digest = Software.digest(apikey)
+        (counter,) = ETag.counters(Software)
+
+        item = softwares.get(digest)
+        if (item is not LRUCache.MISSING) and (item[0] == counter):
+            software = item[1]
+        else:
+            # the counter and the row are read within the same transaction
+            software = flights.do((digest, counter), lambda: (db.session
+                .query(Software.id, Software.name, Software.apikey, Software.team_id)
+                .filter(Software.apikey_digest == digest)
+                .first()
+            ))
+            if not software:
+                return None
+
+            softwares.set(digest, (counter, software))
+
+        if software.name != name:
+            return None
+
+        return software
+
+    @staticmethod
+    def invalidate(apikey: Optional[str] = None) -> None:
+        """Remove a software from the cache after a write
+
+        Args:
+            apikey: the apikey of the software, all the software are removed if None
+        """
+        flights.forget()
+        if apikey is None:
+            softwares.invalidate()
+        else:
+            softwares.delete(Software.digest(apikey))
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        """Return the counters of the software cache and of the coalesced lookups"""
+        return { **softwares.stats(), "flights": flights.stats() }
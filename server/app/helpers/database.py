@@ -13,18 +13,37 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import Any, List, Dict, Optional
+from typing import Any, Dict, Optional
 
-from app import db
+import fcntl
+
+from sqlalchemy import select, update, delete, inspect, text, bindparam, true
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateTable
+
+from app import app, db
 from app.models import (
     Company, Right, Unit, Team, Software,
-    User, Right, UserRight
+    User, Right, UserRight, TEAM_VERSION_TRIGGERS
 )
 
 from .http_response import HTTPResponse
+from .permission import Permission
+from .credentials import Credentials
+from .token import Token
+
+from app.localization import getMessage
 
 
 #----- Globals
+# children of each table with the column referencing their parent
+CHILDREN = {
+    Company: [ (Unit, Unit.company_id) ],
+    Unit: [ (Team, Team.unit_id) ],
+    Team: [ (Software, Software.team_id), (User, User.team_id), (Right, Right.team_id) ],
+    User: [ (UserRight, UserRight.user_id) ],
+    Right: [ (UserRight, UserRight.right_id) ]
+}
 
 
 #----- Functions
@@ -34,6 +53,114 @@ from .http_response import HTTPResponse
 class Database:
     """Helper class to facilitate database management"""
 
+    @staticmethod
+    def initialize() -> None:
+        """Create the missing tables and migrate the database
+
+        Each gunicorn worker runs this when it imports the application: an
+        exclusive lock on a file next to the database lets them run it one
+        after the other, the next ones find the schema up to date.
+        """
+        database = db.engine.url.database
+        if (not database) or (database == ":memory:"):
+            db.create_all()
+            Database.migrate()
+            return
+
+        with open(database + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            db.create_all()
+            Database.migrate()
+
+    @staticmethod
+    def migrate() -> None:
+        """Bring an existing database up to date with the models
+
+        db.create_all() only creates the missing tables, the columns and the
+        indexes added to the models afterwards are created here, and the
+        tables created without AUTOINCREMENT are rebuilt.
+        """
+        # add the missing columns
+        inspector = inspect(db.engine)
+        for table in db.metadata.sorted_tables:
+            existing = [ column['name'] for column in inspector.get_columns(table.name) ]
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(db.engine.dialect)}"
+
+                    # the existing rows receive the server default (mandatory for NOT NULL columns)
+                    if column.server_default is not None:
+                        ddl += f" {'' if column.nullable else 'NOT NULL '}DEFAULT {column.server_default.arg}"
+
+                    with db.engine.begin() as connection:
+                        connection.execute(text(ddl))
+
+        # SQLite reuses the highest rowid after a delete unless the table is AUTOINCREMENT:
+        # the tables created without it are rebuilt (their indexes and triggers are created below)
+        for table in db.metadata.sorted_tables:
+            if table.dialect_options['sqlite']['autoincrement'] and (not Database.autoincrement(table.name)):
+                Database.rebuild(table)
+
+        # compute the digest of the apikeys created before it existed
+        softwares = db.session.query(Software.id, Software.apikey).filter(Software.apikey_digest.is_(None)).all()
+        if softwares:
+            db.session.execute(
+                update(Software.__table__).where(Software.__table__.c.id == bindparam('sid')),
+                [ { 'sid': sid, 'apikey_digest': Software.digest(apikey) } for sid, apikey in softwares ]
+            )
+            db.session.commit()
+
+        # create the missing indexes
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    index.create(bind=db.engine, checkfirst=True)
+                except SQLAlchemyError as e:
+                    app.logger.error(getMessage(0x0003, name=index.name, error=str(e)))
+
+        # create the missing triggers maintaining the version of the teams
+        with db.engine.begin() as connection:
+            for ddl in TEAM_VERSION_TRIGGERS.values():
+                connection.exec_driver_sql(ddl)
+
+    @staticmethod
+    def autoincrement(name: str) -> bool:
+        """Check if a table of the database was created with AUTOINCREMENT"""
+        with db.engine.connect() as connection:
+            sql = connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).scalar()
+
+        return "AUTOINCREMENT" in (sql or "").upper()
+
+    @staticmethod
+    def rebuild(table: Any) -> None:
+        """Create a table again from its model and copy its rows
+
+        SQLite cannot alter a primary key: the new table is created under a
+        temporary name, filled, then renamed once the old one is dropped.
+
+        Args:
+            table: the table of the model
+        """
+        temporary = f"{table.name}_rebuild"
+        columns = ", ".join(f'"{column.name}"' for column in table.columns)
+
+        # the table only (the indexes are created again by migrate)
+        name = db.engine.dialect.identifier_preparer.format_table(table)
+        ddl = str(CreateTable(table).compile(dialect=db.engine.dialect)).replace(
+            f"CREATE TABLE {name} ", f'CREATE TABLE "{temporary}" ', 1
+        )
+
+        with db.engine.begin() as connection:
+            # a trigger referencing a dropped table would prevent the rename
+            for trigger in TEAM_VERSION_TRIGGERS:
+                connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS "{temporary}"')
+            connection.exec_driver_sql(ddl)
+            connection.exec_driver_sql(f'INSERT INTO "{temporary}" ({columns}) SELECT {columns} FROM "{table.name}"')
+            connection.exec_driver_sql(f'DROP TABLE "{table.name}"')
+            connection.exec_driver_sql(f'ALTER TABLE "{temporary}" RENAME TO "{table.name}"')
+
     @staticmethod
     def deleteAll() -> None:
         """Delete all the tables from the database"""
@@ -42,11 +169,105 @@ class Database:
         Team.query.delete()
         User.query.delete()
         Right.query.delete()
+        Software.query.delete()
         UserRight.query.delete()
+        db.session.commit()
+
+        # the caches and snapshots are rebuilt from the committed data
+        Permission.invalidate()
+        Credentials.invalidate()
+        Token.revoke()
 
     class Delete:
         """Specific helper class for deletion management"""
 
+        @staticmethod
+        def cascade(model: Any, condition: Any) -> Dict[str, int]:
+            """Delete the records matching a condition and all their descendants
+
+            The subtree is removed with one DELETE ... WHERE ... IN (subquery)
+            statement per table, leaves first. The caller commits the transaction.
+
+            Args:
+                model: the model of the root records
+                condition: the SQL expression selecting the root records
+
+            Returns:
+                the number of rows removed for each table
+            """
+            counts: Dict[str, int] = {}
+
+            def remove(model: Any, condition: Any) -> None:
+                # children are selected through the ids of their parent, before the parent is removed
+                ids = select(model.id).where(condition)
+                for child, column in CHILDREN.get(model, []):
+                    remove(child, column.in_(ids))
+
+                result = db.session.execute(
+                    delete(model)
+                    .where(condition)
+                    .execution_options(synchronize_session=False)
+                )
+
+                name = model.__tablename__
+                counts[name] = counts.get(name, 0) + result.rowcount
+
+            remove(model, condition)
+
+            app.logger.info(getMessage(0x0004, report=Database.Delete.report(counts)))
+            return counts
+
+        @staticmethod
+        def commit(counts: Dict[str, int]) -> None:
+            """Commit a cascade deletion, then forget the removed software
+
+            The caches are cleared once the rows are gone, so a concurrent
+            request cannot cache again a software being deleted.
+
+            Args:
+                counts: the number of rows removed for each table, as returned by cascade()
+            """
+            db.session.commit()
+
+            # removed software must not authenticate anymore
+            if counts.get(Software.__tablename__):
+                Credentials.invalidate()
+                Token.revoke()
+
+        @staticmethod
+        def all(model: Any) -> HTTPResponse:
+            """Delete all the records of a table and their descendants
+
+            One DELETE statement per table and a single commit, whatever the
+            number of records.
+
+            Args:
+                model: the model of the table
+
+            Returns:
+                HTTPResponse value 204 with the number of rows removed
+            """
+            counts = Database.Delete.cascade(model, true())
+            Database.Delete.commit(counts)
+
+            # the users, rights or grants of any team may have been removed
+            if any(counts.get(table.__tablename__) for table in (User, Right, UserRight)):
+                Permission.invalidate()
+
+            return Database.Delete.done(counts)
+
+        @staticmethod
+        def report(counts: Dict[str, int]) -> str:
+            """Format the number of rows removed for each table"""
+            return ", ".join([ f"{name}={count}" for name, count in counts.items() ])
+
+        @staticmethod
+        def done(counts: Dict[str, int]) -> HTTPResponse:
+            """Create the 204 response for a deletion, with the number of rows removed"""
+            response = HTTPResponse.noContent()
+            response.headers['X-Deleted-Rows'] = Database.Delete.report(counts)
+            return response
+
         @staticmethod
         def Company(company_id: Optional[int]) -> HTTPResponse:
             """Delete Company record
@@ -63,18 +284,14 @@ class Database:
             if company_id is None:
                 raise Exception("company_id is None in Delete::Company")
 
-            company: Company = Company.query.filter(Company.id == company_id).first()
-            if company:
-                # cascade the deletion to all Units
-                Database.Delete.Unit(None, company.id)
-
-                # delete this company
-                db.session.delete(company)
-                db.session.commit()
+            if db.session.query(Company.id).filter(Company.id == company_id).first():
+                counts = Database.Delete.cascade(Company, Company.id == company_id)
+                Database.Delete.commit(counts)
 
-                return HTTPResponse.noContent()
+                Permission.invalidate()
+                return Database.Delete.done(counts)
             else:
-                return HTTPResponse.error404(company_id, 'company')
+                return HTTPResponse.error(0x4041, table='Company', rid=company_id)
 
         @staticmethod
         def Unit(unit_id: Optional[int], company_id: Optional[int]) -> HTTPResponse|None:
@@ -95,25 +312,21 @@ class Database:
 
             # delete a single unit
             if unit_id:
-                unit: Unit = Unit.query.filter(Unit.id == unit_id).first()
-                if unit:
-                    # cascade the deletion to teams
-                    Database.Delete.Team(None, unit.id)
+                if db.session.query(Unit.id).filter(Unit.id == unit_id).first():
+                    counts = Database.Delete.cascade(Unit, Unit.id == unit_id)
+                    Database.Delete.commit(counts)
 
-                    db.session.delete(unit)
-                    db.session.commit()
-
-                    return HTTPResponse.noContent()
+                    Permission.invalidate()
+                    return Database.Delete.done(counts)
                 else:
-                    return HTTPResponse.error404(unit_id, 'Unit')
+                    return HTTPResponse.error(0x4041, table='Unit', rid=unit_id)
 
             # massive deletion
             if company_id:
-                units: List[Unit] = Unit.query.filter(Unit.company_id == company_id).all()
-                for unit in units:
-                    Database.Delete.Team(None, unit.id)
-                    db.session.delete(unit)
-                db.session.commit()
+                counts = Database.Delete.cascade(Unit, Unit.company_id == company_id)
+                Database.Delete.commit(counts)
+
+                Permission.invalidate()
 
         @staticmethod
         def Team(team_id: Optional[int], unit_id: Optional[int]) -> HTTPResponse|None:
@@ -129,38 +342,25 @@ class Database:
             Returns:
                 HTTPResponse value 204 on success, 404 if the Team cannot be found
             """
-            def removeTeam(team: Team) -> None:
-                """Remove all the dependencies from a Team"""
-                # delete all the associated Software
-                Database.Delete.Software(None, team.id)
-
-                # delete all the associated Users
-                Database.Delete.User(None, team.id)
-
-                # delete all the associated Rights
-                Database.Delete.Right(None, team.id)
-
-                # remove the team
-                db.session.delete(team)
-                db.session.commit()
-
-
             if (team_id is None) and (unit_id is None):
                 raise Exception("Both team_id and unit_id are None in Delete::Team.")
 
             if team_id:
-                team: Team = Team.query.filter(Team.id == team_id).first()
-                if team:
-                    removeTeam(team)
-                    return HTTPResponse.noContent()
+                if db.session.query(Team.id).filter(Team.id == team_id).first():
+                    counts = Database.Delete.cascade(Team, Team.id == team_id)
+                    Database.Delete.commit(counts)
+
+                    Permission.invalidate(team_id)
+                    return Database.Delete.done(counts)
                 else:
-                    return HTTPResponse.error404(team_id, 'Team')
+                    return HTTPResponse.error(0x4041, table='Team', rid=team_id)
 
             # massive deletion
             if unit_id:
-                teams: List[Team] = Team.query.filter(Team.unit_id == unit_id).all()
-                for team in teams:
-                    removeTeam(team)
+                counts = Database.Delete.cascade(Team, Team.unit_id == unit_id)
+                Database.Delete.commit(counts)
+
+                Permission.invalidate()
 
         @staticmethod
         def Software(soft_id: Optional[int], team_id: Optional[int]) -> HTTPResponse|None:
@@ -180,20 +380,18 @@ class Database:
                 raise Exception("Both soft_id and team_id are None in Delete::Software.")
 
             if soft_id:
-                software: Software = Software.query.filter(Software.id == soft_id).first()
-                if software:
-                    db.session.delete(software)
-                    db.session.commit()
-                    return HTTPResponse.noContent()
+                if db.session.query(Software.id).filter(Software.id == soft_id).first():
+                    counts = Database.Delete.cascade(Software, Software.id == soft_id)
+                    Database.Delete.commit(counts)
+
+                    return Database.Delete.done(counts)
                 else:
-                    return HTTPResponse.error404(soft_id, 'Software')
+                    return HTTPResponse.error(0x4041, table='Software', rid=soft_id)
 
             # massive deletion
             if team_id:
-                softs: Software = Software.query.filter(Software.team_id == team_id).all()
-                for soft in softs:
-                    db.session.delete(soft)
-                db.session.commit()
+                counts = Database.Delete.cascade(Software, Software.team_id == team_id)
+                Database.Delete.commit(counts)
 
         @staticmethod
         def User(user_id: Optional[int], team_id: Optional[int]) -> HTTPResponse|None:
@@ -214,23 +412,22 @@ class Database:
                 raise Exception("Both user_id and team_id are None in Delete::User.")
 
             if user_id:
-                user: User = User.query.filter(User.id == user_id).first()
+                user = db.session.query(User.team_id).filter(User.id == user_id).first()
                 if user:
-                    Database.Delete.UserRight(user_id=user.id)
-                    db.session.delete(user)
-                    db.session.commit()
+                    counts = Database.Delete.cascade(User, User.id == user_id)
+                    Database.Delete.commit(counts)
 
-                    return HTTPResponse.noContent()
+                    Permission.invalidate(user.team_id)
+                    return Database.Delete.done(counts)
                 else:
-                    return HTTPResponse.error404(user_id, 'User')
+                    return HTTPResponse.error(0x4041, table='User', rid=user_id)
 
             # massive deletion
             if team_id:
-                users: List[User] = User.query.filter(User.team_id == team_id).all()
-                for user in users:
-                    Database.Delete.UserRight(user_id=user.id)
-                    db.session.delete(user)
-                db.session.commit()
+                counts = Database.Delete.cascade(User, User.team_id == team_id)
+                Database.Delete.commit(counts)
+
+                Permission.invalidate(team_id)
 
         @staticmethod
         def Right(right_id: Optional[int], team_id: Optional[int]) -> HTTPResponse|None:
@@ -250,26 +447,25 @@ class Database:
                 raise Exception("Both right_id and team_id are None in Delete::Right.")
 
             if right_id:
-                right: Right = Right.query.filter(Right.id == right_id).first()
+                right = db.session.query(Right.team_id).filter(Right.id == right_id).first()
                 if right:
-                    Database.Delete.UserRight(right_id=right_id)
-                    db.session.delete(right)
-                    db.session.commit()
+                    counts = Database.Delete.cascade(Right, Right.id == right_id)
+                    Database.Delete.commit(counts)
 
-                    return HTTPResponse.noContent()
+                    Permission.invalidate(right.team_id)
+                    return Database.Delete.done(counts)
                 else:
-                    return HTTPResponse.error404(right_id, 'Right')
+                    return HTTPResponse.error(0x4041, table='Right', rid=right_id)
 
             # massive deletion
             if team_id:
-                rights: List[Right] = Right.query.filter(Right.team_id == team_id).all()
-                for right in rights:
-                    Database.Delete.UserRight(right_id=right.id)
-                    db.session.delete(right)
-                db.session.commit()
+                counts = Database.Delete.cascade(Right, Right.team_id == team_id)
+                Database.Delete.commit(counts)
+
+                Permission.invalidate(team_id)
 
         @staticmethod
-        def UserRight(usrg_id: Optional[int] = None, user_id: Optional[int] = None, right_id: Optional[int] = None) -> None:
+        def UserRight(usrg_id: Optional[int] = None, user_id: Optional[int] = None, right_id: Optional[int] = None) -> HTTPResponse|None:
             """Delete UserRight record either from a user_id or right_id
 
             Args:
@@ -279,6 +475,9 @@ class Database:
 
             Raises:
                 Exception is unit_id/company_id are None
+
+            Returns:
+                HTTPResponse value 204 on success, 404 if the UserRight cannot be found
             """
 
             # nothing to do
@@ -286,23 +485,33 @@ class Database:
                 raise Exception("All usrg_id, user_id and right_id are None in Delete::UserRight.")
 
             if usrg_id:
-                usrg: UserRight = UserRight.query.filter(UserRight.id == usrg_id).first()
+                usrg = (db.session
+                    .query(User.team_id)
+                    .join(UserRight, UserRight.user_id == User.id)
+                    .filter(UserRight.id == usrg_id)
+                    .first()
+                )
                 if usrg:
-                    db.session.delete(usrg)
-                    db.session.commit()
+                    counts = Database.Delete.cascade(UserRight, UserRight.id == usrg_id)
+                    Database.Delete.commit(counts)
 
-                    return HTTPResponse.noContent()
+                    Permission.invalidate(usrg.team_id)
+                    return Database.Delete.done(counts)
                 else:
-                    return HTTPResponse.error404(usrg_id, 'UserRight')
+                    return HTTPResponse.error(0x4041, table='UserRight', rid=usrg_id)
 
             if user_id:
-                users: List[UserRight] = UserRight.query.filter(UserRight.user_id == user_id).all()
-                for user in users:
-                    db.session.delete(user)
-                db.session.commit()
+                user = db.session.query(User.team_id).filter(User.id == user_id).first()
+                counts = Database.Delete.cascade(UserRight, UserRight.user_id == user_id)
+                Database.Delete.commit(counts)
+
+                if user:
+                    Permission.invalidate(user.team_id)
 
             if right_id:
-                rights: List[UserRight] = UserRight.query.filter(UserRight.right_id == right_id).all()
-                for right in rights:
-                    db.session.delete(right)
-                db.session.commit()
+                right = db.session.query(Right.team_id).filter(Right.id == right_id).first()
+                counts = Database.Delete.cascade(UserRight, UserRight.right_id == right_id)
+                Database.Delete.commit(counts)
+
+                if right:
+                    Permission.invalidate(right.team_id)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Strong ETags for conditional GET requests
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Tuple
+
+import hashlib
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.dml import UpdateBase
+
+from app import app, db
+from app.models import TableVersion
+
+from .http_response import Serializer, Compressor
+
+
+#----- Functions
+
+# increment the change counter of a table each time rows are written in it
+@event.listens_for(Engine, "after_execute")
+def countChanges(conn, clauseelement, multiparams, params, execution_options, result):
+    if not isinstance(clauseelement, UpdateBase):
+        return
+
+    table = clauseelement.table
+    if (table.name not in db.metadata.tables) or (table is TableVersion.__table__):
+        return
+
+    # nothing was written (rowcount is -1 when the driver cannot tell)
+    if result.rowcount == 0:
+        return
+
+    # same connection, hence same transaction: a rollback also discards the increment
+    conn.execute(insert(TableVersion.__table__)
+        .values(name=table.name, version=1)
+        .on_conflict_do_update(index_elements=['name'], set_={ 'version': TableVersion.__table__.c.version + 1 })
+    )
+
+
+#----- Class
+class ETag:
+    """Helper class to compute and match strong ETags"""
+
+    @staticmethod
+    def compute(version: Any) -> str:
+        """Compute the strong ETag of the current request
+
+        The URL, the negotiated mimetype and the API version are part of the
+        tag, so each representation of a resource has its own one.
+
+        Args:
+            version: the version of the row or the change counter of the table
+
+        Returns:
+            the ETag (without quotes)
+        """
+        key = f"{app.config['VERSION']}|{Serializer.negotiate()}|{request.full_path}|{version}"
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def row(item: Any) -> str:
+        """Compute the ETag of a single record from its id and version column
+
+        The ids are never reused (AUTOINCREMENT tables), so a record created
+        again after a delete has a new tag.
+        """
+        return ETag.compute(f"{item.id}.{item.version}")
+
+    @staticmethod
+    def table(*models: Any) -> str:
+        """Compute the ETag of a list from the change counters of its tables
+
+        Args:
+            models: the models the list is built from
+
+        Returns:
+            the ETag (without quotes)
+        """
+        return ETag.compute(".".join(f"{counter}" for counter in ETag.counters(*models)))
+
+    @staticmethod
+    def counters(*models: Any) -> Tuple[int, ...]:
+        """Read the change counters of tables with one primary-key lookup each
+
+        Args:
+            models: the models of the tables
+
+        Returns:
+            the counters, in the same order as the models (0 for a table never written)
+        """
+        names = tuple(model.__tablename__ for model in models)
+
+        # read on every /validate: plain SQL on the connection of the session skips the ORM compilation
+        versions = dict(db.session.connection().exec_driver_sql(
+            f"SELECT name, version FROM {TableVersion.__tablename__} WHERE name IN ({', '.join('?' * len(names))})", names
+        ).all())
+        return tuple(versions.get(name, 0) for name in names)
+
+    @staticmethod
+    def matches(etag: str) -> bool:
+        """Check if the client already holds this ETag (If-None-Match header)
+
+        The compressed representations are tagged with the encoding as a suffix.
+        """
+        tags = request.if_none_match
+        return tags.contains(etag) or any(tags.contains(f"{etag}-{encoding}") for encoding in Compressor.encodings)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Coalescing of identical concurrent lookups (single-flight)
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import threading
+
+
+#----- Class
+class Flight:
+    """A lookup in progress and its outcome"""
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+
+
+class SingleFlight:
+    """Thread-safe group of lookups where concurrent calls with the same key share one execution"""
+
+    def __init__(self) -> None:
+        """Constructor"""
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, Flight] = {}
+
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        """Execute a lookup, or wait for the identical one already in progress
+
+        Args:
+            key: the key identifying the lookup
+            function: the lookup itself
+
+        Raises:
+            the exception raised by the lookup, for the caller and all the waiters
+
+        Returns:
+            the result of the lookup
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self._flights[key] = flight
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = function()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.event.set()
+
+        return flight.result
+
+    def forget(self) -> None:
+        """Let the next calls start new lookups instead of joining the ones in progress (after a write)"""
+        with self._lock:
+            self._flights.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the counters of the lookups"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights)
+            }
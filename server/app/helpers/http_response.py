@@ -13,12 +13,282 @@
 
 #----- Imports
 from __future__ import annotations
-from typing import Any, List, Dict
+from typing import Any, Callable, List, Dict, Iterable, Optional, Tuple
 
-from flask import Response, make_response, jsonify
+import json
+import zlib
+
+from flask import Response, request, has_request_context, stream_with_context
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 from app import app
-from app.localization import getMessage
+from app.localization import getMessage, messages
+
+
+#----- Functions
+def dumpsJSON(value: Any) -> bytes:
+    """Encode a value with the standard json module"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+def dumpsORJSON(value: Any) -> bytes:
+    """Encode a value with orjson"""
+    return orjson.dumps(value)
+
+def packMSGPACK(value: Any) -> bytes:
+    """Encode a value with MessagePack"""
+    return msgpack.packb(value)
+
+def gzipCompressor() -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """Create a gzip stream compressor"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+def brotliCompressor() -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """Create a brotli stream compressor"""
+    compressor = brotli.Compressor(quality=4)
+    return compressor.process, compressor.finish
+
+def zstdCompressor() -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """Create a zstd stream compressor"""
+    compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    return compressor.compress, compressor.flush
+
+def encoder(name: str) -> Callable[[Any], bytes]:
+    """Select the JSON encoder of the responses
+
+    Args:
+        name: "auto", "orjson" or "json"
+
+    Raises:
+        'ValueError' if the encoder is unknown or not installed
+
+    Returns:
+        the function encoding a value into compact JSON bytes
+    """
+    if name == "json":
+        return dumpsJSON
+
+    if name == "orjson":
+        if orjson is None:
+            raise ValueError("JSON_SERIALIZER is 'orjson' but the orjson module is not installed.")
+        return dumpsORJSON
+
+    if name == "auto":
+        return dumpsJSON if orjson is None else dumpsORJSON
+
+    raise ValueError(f"Unknown JSON_SERIALIZER '{name}' (auto | orjson | json).")
+
+def httpCode(code: int) -> int:
+    """Retrieve the HTTP status code encoded in a message code (0x4041 => 404)"""
+    d1 = (code >> 4) & 0x0f
+    d2 = (code >> 8) & 0x0f
+    d3 = (code >> 12) & 0x0f
+    return d3 * 100 + d2 * 10 + d1
+
+def prebuild() -> Dict[int, Tuple[Dict[str, bytes], int]]:
+    """Encode once the error responses whose message does not take any parameter
+
+    Returns:
+        the encoded bodies (one per mimetype) and the HTTP status for each message code
+    """
+    bodies: Dict[int, Tuple[Dict[str, bytes], int]] = {}
+    for code, message in messages.items():
+        http_code = httpCode(code)
+        if (http_code < 400) or ("{" in message):
+            continue
+
+        value = {
+            "error": {
+                "code": f"{http_code}",
+                "message": message
+            }
+        }
+        bodies[code] = ({ mimetype: Serializer.encode(value, mimetype) for mimetype in Serializer.mimetypes }, http_code)
+
+    return bodies
+
+
+#----- Class
+class Serializer:
+    """Encoders used for all the responses
+
+    JSON is the default, MessagePack is negotiated with the Accept header
+    when the msgpack module is installed.
+    """
+
+    JSON = "application/json"
+    MSGPACK = "application/msgpack"
+
+    # compact JSON bytes, without pretty-printing (selected with JSON_SERIALIZER)
+    dumps = staticmethod(encoder(app.config['JSON_SERIALIZER']))
+
+    # mimetypes offered to the clients, by order of preference
+    mimetypes = [ JSON ] if msgpack is None else [ JSON, MSGPACK ]
+
+    @staticmethod
+    def negotiate() -> str:
+        """Select the mimetype of the response from the Accept header
+
+        Returns:
+            the mimetype, JSON if the client has no preference
+        """
+        if (len(Serializer.mimetypes) == 1) or (not has_request_context()):
+            return Serializer.JSON
+
+        return request.accept_mimetypes.best_match(Serializer.mimetypes, default=Serializer.JSON)
+
+    @staticmethod
+    def encode(value: Any, mimetype: str) -> bytes:
+        """Encode a value in one of the available mimetypes
+
+        Args:
+            value: the value to encode
+            mimetype: the mimetype returned by negotiate()
+
+        Returns:
+            the encoded value
+        """
+        if mimetype == Serializer.MSGPACK:
+            return packMSGPACK(value)
+
+        return Serializer.dumps(value)
+
+    @staticmethod
+    def loads(data: bytes) -> Any:
+        """Decode a MessagePack request body
+
+        Args:
+            data: the body of the request
+
+        Raises:
+            'BadRequest' if the body cannot be decoded
+            'UnsupportedMediaType' if the msgpack module is not installed
+
+        Returns:
+            the decoded value
+        """
+        if msgpack is None:
+            raise UnsupportedMediaType()
+
+        try:
+            return msgpack.unpackb(data)
+        except Exception:
+            raise BadRequest("Failed to decode MessagePack object.")
+
+    @staticmethod
+    def response(value: Any, status: int) -> Response:
+        """Create a response in the mimetype negotiated with the client
+
+        Args:
+            value: the data for the response
+            status: the HTTP status code
+
+        Returns:
+            a Response object
+        """
+        mimetype = Serializer.negotiate()
+        response = Response(Serializer.encode(value, mimetype), status=status, mimetype=mimetype)
+        if len(Serializer.mimetypes) > 1:
+            response.vary.add('Accept')
+
+        return response
+
+
+class Compressor:
+    """Content-Encoding negotiated with the Accept-Encoding header"""
+
+    # available encodings, by order of preference
+    encodings: Dict[str, Callable[[], Tuple[Callable[[bytes], bytes], Callable[[], bytes]]]] = {
+        **({ 'zstd': zstdCompressor } if zstandard is not None else {}),
+        **({ 'br': brotliCompressor } if brotli is not None else {}),
+        'gzip': gzipCompressor
+    }
+
+    # blueprints whose answers are never compressed (small and latency sensitive)
+    excluded = [ 'validation' ]
+
+    @staticmethod
+    def negotiate() -> Optional[str]:
+        """Select the encoding of the response from the Accept-Encoding header
+
+        Returns:
+            the encoding, None if the response must not be compressed
+        """
+        if (not has_request_context()) or (request.blueprint in Compressor.excluded):
+            return None
+
+        return request.accept_encodings.best_match(list(Compressor.encodings))
+
+    @staticmethod
+    def compress(response: Response) -> Response:
+        """Compress a response if the client accepts it and it is large enough
+
+        Args:
+            response: the response object
+
+        Returns:
+            the response object, compressed or not
+        """
+        response.vary.add('Accept-Encoding')
+
+        encoding = Compressor.negotiate()
+        if (encoding is None) or (response.content_length or 0) < app.config['COMPRESSION_MIN_SIZE']:
+            return response
+
+        compress, finish = Compressor.encodings[encoding]()
+        response.set_data(compress(response.get_data()) + finish())
+        response.headers['Content-Encoding'] = encoding
+
+        # each encoding is a different representation, hence a different strong ETag
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+
+        return response
+
+    @staticmethod
+    def stream(chunks: Iterable[Any], encoding: str) -> Iterable[bytes]:
+        """Compress a streamed body on the fly
+
+        Args:
+            chunks: generator producing the body of the response
+            encoding: the encoding returned by negotiate()
+
+        Returns:
+            a generator producing the compressed body
+        """
+        compress, finish = Compressor.encodings[encoding]()
+        for chunk in chunks:
+            data = compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+
+        yield finish()
+
+
+#----- Globals
+# prebuilt error responses
+errors = prebuild()
 
 
 #----- Class
@@ -53,22 +323,26 @@ class HTTPResponse:
             a Response object
         """
 
+        # messages without parameters are served from their prebuilt body
+        if (not kwargs) and (code in errors):
+            bodies, http_code = errors[code]
+            mimetype = Serializer.negotiate()
+            response = Response(bodies[mimetype], status=http_code, mimetype=mimetype,
+                headers={ 'X-API-Version': app.config['VERSION'] })
+            if len(Serializer.mimetypes) > 1:
+                response.vary.add('Accept')
+            return response
+
         # retrieve the HTTP code
-        d1 = (code >> 4) & 0x0f
-        d2 = (code >> 8) & 0x0f
-        d3 = (code >> 12) & 0x0f
-        http_code = int(f"{d3}{d2}{d1}")
+        http_code = httpCode(code)
 
-        # create the JSON value for this error
-        value = jsonify({
+        # create the response for this error and add extra headers
+        response = Serializer.response({
             "error": {
                 "code": f"{http_code}",
                 "message": getMessage(code, **kwargs)
             }
-        })
-
-        # create the response and add extra headers
-        response = make_response(value, http_code)
+        }, http_code)
         response = HTTPResponse.headers(response)
 
         return response
@@ -84,12 +358,10 @@ class HTTPResponse:
         Returns:
             a Response object
         """
-        value = jsonify({
-            "id": f"{item_id}",
-        })
-
         # create the response and add extra headers
-        response = make_response(value, 201)
+        response = Serializer.response({
+            "id": item_id,
+        }, 201)
         response = HTTPResponse.headers(response)
         response.headers['Location'] = url
 
@@ -103,24 +375,74 @@ class HTTPResponse:
             a Response object
         """
         # create the response and add extra headers
-        response = make_response(jsonify({}), 204)
+        response = Serializer.response({}, 204)
         response = HTTPResponse.headers(response)
 
         return response
 
     @staticmethod
-    def ok(message: str) -> Response:
+    def ok(message: str, etag: Optional[str] = None) -> Response:
         """Create a HTTP 200 (OK) response
 
         Args:
             message: the data for the response
+            etag: the strong ETag of the data if any
 
         Returns:
             a Response object
         """
         # create the response and add extra headers
-        response = make_response(jsonify(message), 200)
+        response = Serializer.response(message, 200)
+        response = HTTPResponse.headers(response)
+        if etag:
+            response.set_etag(etag)
+
+        # large answers are compressed if the client accepts it
+        response = Compressor.compress(response)
+
+        return response
+
+    @staticmethod
+    def notModified(etag: str) -> Response:
+        """Create a HTTP 304 (Not Modified) response
+
+        Args:
+            etag: the ETag matched by the If-None-Match header
+
+        Returns:
+            a Response object
+        """
+        response = Response(status=304)
+        response = HTTPResponse.headers(response)
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        if len(Serializer.mimetypes) > 1:
+            response.vary.add('Accept')
+
+        return response
+
+    @staticmethod
+    def stream(chunks: Iterable[Any], mimetype: str) -> Response:
+        """Create a HTTP 200 (OK) streamed response
+
+        Args:
+            chunks: generator producing the body of the response
+            mimetype: the mimetype of the response
+
+        Returns:
+            a Response object
+        """
+        # the body is compressed on the fly if the client accepts it (whatever its size)
+        encoding = Compressor.negotiate()
+        if encoding is not None:
+            chunks = Compressor.stream(chunks, encoding)
+
+        # the request context is kept alive while the body is produced
+        response = Response(stream_with_context(chunks), status=200, mimetype=mimetype)
         response = HTTPResponse.headers(response)
+        response.vary.add('Accept-Encoding')
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
 
         return response
 
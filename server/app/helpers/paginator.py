@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Class to paginate the "Get All" queries
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, List, Dict, Optional, Tuple
+
+import json
+import base64
+import binascii
+
+from flask import Request
+from sqlalchemy import func, select
+from sqlalchemy.orm import Query
+
+from app import app
+
+from .validator import Validator
+
+
+#----- Class
+class Paginator:
+    """Keyset pagination shared by all the list endpoints"""
+
+    @staticmethod
+    def encode(last_id: int) -> str:
+        """Create an opaque cursor pointing after an item
+
+        Args:
+            last_id: ID of the last item of the page
+
+        Returns:
+            the cursor as an url-safe string
+        """
+        value = json.dumps({ "id": last_id }, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(value).decode().rstrip("=")
+
+    @staticmethod
+    def decode(cursor: str) -> int:
+        """Retrieve the ID contained in a cursor
+
+        Args:
+            cursor: the cursor returned with the previous page
+
+        Raises:
+            'ValueError' if the cursor is not valid
+
+        Returns:
+            the ID of the last item of the previous page
+        """
+        try:
+            value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            return int(json.loads(value)["id"])
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise ValueError(('cursor', 'cursor'))
+
+    @staticmethod
+    def parameters(request: Request) -> Dict[str, Any]:
+        """Validate the pagination parameters from query
+
+        Args:
+            request: the HTTP request
+
+        Raises:
+            'ValueError' if a parameter cannot be cast to a proper value
+
+        Returns:
+            a Dict[str, Any] with the parameter values
+        """
+        params = Validator.parameters(request, [
+            ('offset', 0),
+            ('limit', app.config['DEFAULT_LIMIT_VALUE']),
+            ('cursor', ""),
+            ('sync', ""),
+            ('total', "")
+        ])
+
+        # total number of items: not computed, exact or bounded by COUNT_ESTIMATE_LIMIT
+        if params['total'] not in [ "", "exact", "estimate" ]:
+            raise ValueError(('total', 'exact | estimate'))
+
+        # sync=0 or sync=false must not enable the larger pages
+        params['sync'] = params['sync'].lower() in ("1", "true", "yes")
+
+        # ensure parameters remains positive
+        params['offset'] = abs(params['offset'])
+        params['limit'] = abs(params['limit'])
+
+        # administrative synchronisations are allowed to retrieve larger pages
+        max_limit = app.config['MAX_SYNC_LIMIT_VALUE'] if params['sync'] else app.config['MAX_LIMIT_VALUE']
+        if params['limit'] > max_limit:
+            params['limit'] = max_limit
+
+        params['after'] = Paginator.decode(params['cursor']) if params['cursor'] else None
+
+        return params
+
+    @staticmethod
+    def total(query: Query, column: Any, exact: bool) -> Dict[str, Any]:
+        """Count the items selected by a query
+
+        Args:
+            query: the query selecting the items
+            column: the unique column of the items
+            exact: False to stop counting after COUNT_ESTIMATE_LIMIT rows
+
+        Returns:
+            the pagination fields 'total' and 'total_exact'
+        """
+        query = query.order_by(None)
+        if exact:
+            return { "total": query.count(), "total_exact": True }
+
+        # counting a bounded subquery keeps the cost constant on large tables
+        limit = app.config['COUNT_ESTIMATE_LIMIT']
+        bounded = query.with_entities(column).limit(limit).subquery()
+        total = query.session.execute(select(func.count()).select_from(bounded)).scalar()
+
+        return { "total": total, "total_exact": total < limit }
+
+    @staticmethod
+    def page(query: Query, column: Any, params: Dict[str, Any]) -> Tuple[List[Any], Dict[str, Any]]:
+        """Retrieve one page of items
+
+        Args:
+            query: the query selecting the items
+            column: the unique column the items are sorted on (usually the ID)
+            params: the parameters returned by Paginator.parameters
+
+        Returns:
+            the list of items and the pagination fields of the result
+        """
+        # the total is computed on all the items, not only on the page
+        totals: Dict[str, Any] = {}
+        if params['total']:
+            totals = Paginator.total(query, column, params['total'] == "exact")
+
+        if params['after'] is not None:
+            query = query.filter(column > params['after'])
+        else:
+            query = query.filter(column >= params['offset'])
+
+        # one extra item tells if there is a next page
+        items: List[Any] = query.order_by(column).limit(params['limit'] + 1).all()
+
+        next_cursor: Optional[str] = None
+        if len(items) > params['limit']:
+            items = items[:params['limit']]
+            if items:
+                next_cursor = Paginator.encode(items[-1].id)
+
+        return items, {
+            "offset": params['offset'],
+            "limit": params['limit'],
+            "count": len(items),
+            "next_cursor": next_cursor,
+            **totals
+        }
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Class to answer user/right authorization requests
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, exists, and_
+
+from app import app, db
+from app.models import (
+    User, Right, UserRight
+)
+
+from .cache import LRUCache, Generations
+from .flight import SingleFlight
+from .bloom import Bloom
+from .snapshot import Snapshot
+from .shared_snapshot import SharedSnapshot
+from .versions import Versions
+
+
+#----- Globals
+# decisions cache indexed by (team_id, email, right)
+decisions = LRUCache(app.config['PERMISSION_CACHE_SIZE'], app.config['PERMISSION_CACHE_TTL'])
+
+# effective rights cache indexed by (team_id, email)
+effective = LRUCache(app.config['PERMISSION_CACHE_SIZE'], app.config['PERMISSION_CACHE_TTL'])
+
+# concurrent lookups of the same (team_id, email, right) or (team_id, email) share one query
+flights = SingleFlight()
+
+# a lookup which started before an invalidation of its team is not cached
+generations = Generations()
+
+
+#----- Class
+class Permission:
+    """Helper class to answer 'does email X hold right Y in team Z'"""
+
+    # results of a permission check (they map directly to localized messages)
+    GRANTED = 0x2000
+    UNKNOWN = 0x4011
+    DENIED  = 0x4030
+
+    @staticmethod
+    def cached(cache: LRUCache, key: Tuple, version: int) -> Any:
+        """Retrieve an entry of a cache, unless it was computed from an older version of its team
+
+        Returns:
+            the value, or LRUCache.MISSING if absent, expired or older than the team
+        """
+        item = cache.get(key)
+        if (item is LRUCache.MISSING) or (item[0] != version):
+            return LRUCache.MISSING
+
+        return item[1]
+
+    @staticmethod
+    def decision(granted: Optional[bool]) -> int:
+        """Convert the answer of a snapshot into a permission result"""
+        if granted is None:
+            return Permission.UNKNOWN
+
+        return Permission.GRANTED if granted else Permission.DENIED
+
+    @staticmethod
+    def check(team_id: Any, email: str, right: str) -> int:
+        """Check if a user holds a right within a team
+
+        The answer comes from the snapshot of the team if enabled (rebuilt once
+        the version of the team changed), otherwise positive and negative
+        answers are kept in the decisions cache with the version of the team
+        they were read with, and the Bloom filter of the team rejects the
+        unknown emails and rights.
+
+        Args:
+            team_id: ID of the team (as stored in the token)
+            email: email of the user
+            right: name of the right
+
+        Returns:
+            one of Permission.GRANTED, Permission.UNKNOWN or Permission.DENIED
+        """
+        key = (int(team_id), email, right)
+
+        if app.config['PERMISSION_SNAPSHOT'] == "mmap":
+            return Permission.decision(SharedSnapshot.check(key[0], email, right, Versions.team(key[0])))
+
+        if app.config['PERMISSION_SNAPSHOT']:
+            return Permission.decision(Snapshot.check(key[0], email, right, Versions.team(key[0])))
+
+        version = Versions.team(key[0])
+        result = Permission.cached(decisions, key, version)
+        if result is LRUCache.MISSING:
+            # unknown emails and rights are rejected without filling the cache
+            if Bloom.reject(key[0], version, email, right):
+                return Permission.UNKNOWN
+
+            generation = generations.get(key[0])
+            result = flights.do((key, version), lambda: Permission.lookup(key[0], email, right))
+            if result == Permission.UNKNOWN:
+                Bloom.falsePositive()
+            if generations.get(key[0]) == generation:
+                decisions.set(key, (version, result))
+
+        return result
+
+    @staticmethod
+    def lookup(team_id: int, email: str, right: str) -> int:
+        """Check if a user holds a right within a team with a single query
+
+        Args:
+            team_id: ID of the team (as stored in the token)
+            email: email of the user
+            right: name of the right
+
+        Returns:
+            Permission.GRANTED if the association exists,
+            Permission.UNKNOWN if the user or the right cannot be found in the team,
+            Permission.DENIED if both exist but the association does not
+        """
+        user_exists = exists().where(and_(User.email == email, User.team_id == team_id))
+        right_exists = exists().where(and_(Right.name == right, Right.team_id == team_id))
+        granted = (exists()
+            .where(and_(
+                User.email == email,
+                User.team_id == team_id,
+                Right.name == right,
+                Right.team_id == team_id,
+                UserRight.user_id == User.id,
+                UserRight.right_id == Right.id
+            ))
+        )
+
+        # one statement, three booleans and no ORM object
+        row = db.session.execute(select(user_exists, right_exists, granted)).first()
+        has_user, has_right, has_grant = row
+
+        if has_grant:
+            return Permission.GRANTED
+
+        if (not has_user) or (not has_right):
+            return Permission.UNKNOWN
+
+        return Permission.DENIED
+
+    @staticmethod
+    def checkMany(team_id: Any, pairs: List[Tuple[str, str]]) -> List[int]:
+        """Check a list of (email, right) pairs within a team
+
+        Pairs not found in the decisions cache are answered with three
+        set-based queries, whatever the number of pairs.
+
+        Args:
+            team_id: ID of the team (as stored in the token)
+            pairs: list of (email, right) to check
+
+        Returns:
+            the list of results, in the same order as the pairs
+        """
+        team_id = int(team_id)
+
+        if app.config['PERMISSION_SNAPSHOT'] == "mmap":
+            version = Versions.team(team_id)
+            return [ Permission.decision(SharedSnapshot.check(team_id, email, right, version)) for email, right in pairs ]
+
+        if app.config['PERMISSION_SNAPSHOT']:
+            snapshot = Snapshot.team(team_id, Versions.team(team_id))
+            return [ Permission.decision(snapshot.check(email, right)) for email, right in pairs ]
+
+        version = Versions.team(team_id)
+        generation = generations.get(team_id)
+
+        results: List[int] = []
+        missing: List[int] = []
+        for index, (email, right) in enumerate(pairs):
+            result = Permission.cached(decisions, (team_id, email, right), version)
+            if result is LRUCache.MISSING:
+                if Bloom.reject(team_id, version, email, right):
+                    result = Permission.UNKNOWN
+                else:
+                    missing.append(index)
+            results.append(result)
+
+        if not missing:
+            return results
+
+        emails = { pairs[index][0] for index in missing }
+        names = { pairs[index][1] for index in missing }
+
+        # retrieve the users and the rights of the team in one query each
+        users: Dict[str, int] = dict(db.session.execute(
+            select(User.email, User.id)
+            .where(User.team_id == team_id, User.email.in_(emails))
+        ).all())
+
+        rights: Dict[str, int] = dict(db.session.execute(
+            select(Right.name, Right.id)
+            .where(Right.team_id == team_id, Right.name.in_(names))
+        ).all())
+
+        # retrieve all the associations between them
+        grants = set()
+        if users and rights:
+            grants = set(db.session.execute(
+                select(UserRight.user_id, UserRight.right_id)
+                .where(UserRight.user_id.in_(users.values()), UserRight.right_id.in_(rights.values()))
+            ).all())
+
+        store = generations.get(team_id) == generation
+        for index in missing:
+            email, right = pairs[index]
+            if (email not in users) or (right not in rights):
+                result = Permission.UNKNOWN
+                Bloom.falsePositive()
+            elif (users[email], rights[right]) in grants:
+                result = Permission.GRANTED
+            else:
+                result = Permission.DENIED
+
+            if store:
+                decisions.set((team_id, email, right), (version, result))
+            results[index] = result
+
+        return results
+
+    @staticmethod
+    def rights(team_id: Any, email: str) -> Optional[List[str]]:
+        """Retrieve the names of all the rights granted to a user within a team
+
+        The list is kept in the effective rights cache, with the version of
+        the team it was read with.
+
+        Args:
+            team_id: ID of the team (as stored in the token)
+            email: email of the user
+
+        Returns:
+            the sorted list of right names, None if the user cannot be found in the team
+        """
+        key = (int(team_id), email)
+
+        version = Versions.team(key[0])
+        result = Permission.cached(effective, key, version)
+        if result is LRUCache.MISSING:
+            if Bloom.reject(key[0], version, email):
+                return None
+
+            generation = generations.get(key[0])
+            result = flights.do((key, version), lambda: Permission.lookupRights(key[0], email))
+            if result is None:
+                Bloom.falsePositive()
+            if generations.get(key[0]) == generation:
+                effective.set(key, (version, result))
+
+        return result
+
+    @staticmethod
+    def lookupRights(team_id: int, email: str) -> Optional[List[str]]:
+        """Retrieve the names of all the rights granted to a user with a single query (no cache)
+
+        Args:
+            team_id: ID of the team
+            email: email of the user
+
+        Returns:
+            the sorted list of right names, None if the user cannot be found in the team
+        """
+        # one row per grant, or a single row with no right if the user has none
+        rows = db.session.execute(
+            select(User.id, Right.name)
+            .select_from(User)
+            .outerjoin(UserRight, UserRight.user_id == User.id)
+            .outerjoin(Right, and_(Right.id == UserRight.right_id, Right.team_id == User.team_id))
+            .where(User.email == email, User.team_id == team_id)
+            .order_by(Right.name)
+        ).all()
+
+        return [ name for _, name in rows if name is not None ] if rows else None
+
+    @staticmethod
+    def invalidate(team_id: Optional[int] = None) -> None:
+        """Invalidate the cached decisions and rights after a write
+
+        Args:
+            team_id: ID of the team whose users/rights changed, all the teams if None
+        """
+        generations.bump(None if team_id is None else int(team_id))
+        flights.forget()
+        if team_id is None:
+            decisions.invalidate()
+            effective.invalidate()
+        else:
+            team_id = int(team_id)
+            decisions.invalidate(lambda key: key[0] == team_id)
+            effective.invalidate(lambda key: key[0] == team_id)
+
+        Versions.forget(team_id)
+        Bloom.invalidate(team_id)
+        Snapshot.invalidate(team_id)
+        if app.config['PERMISSION_SNAPSHOT'] == "mmap":
+            SharedSnapshot.invalidate(team_id)
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        """Return the counters of the permission caches"""
+        return {
+            "decisions": decisions.stats(),
+            "rights": effective.stats(),
+            "snapshot": Snapshot.stats(),
+            "shared": SharedSnapshot.stats(),
+            "bloom": Bloom.stats(),
+            "flights": flights.stats()
+        }
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Permission snapshot file shared by all the workers through mmap
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+
+import fcntl
+import glob
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from sqlalchemy import select
+
+from app import app, db
+from app.models import (
+    User, Right, UserRight
+)
+
+from app.localization import getMessage
+
+from .snapshot import Snapshot
+from .versions import Versions
+
+
+#----- Globals
+# file layout (little endian):
+#   header
+#   users: hash table of slots (record index + 1, 0 = empty) then fixed-size records
+#          (key hash, key offset, key length, padding) followed by the bitmask of the rights
+#   rights: hash table of slots then records (key hash, key offset, key length, bit index)
+#   teams: (team_id, version) of the teams written at least once, versions read before the build
+#   keys: the "team_id\0email" and "team_id\0right" strings, UTF-8 encoded
+MAGIC = b"DUDESNP3"
+HEADER = struct.Struct("<8sQIIIIII6Q")
+RECORD = struct.Struct("<QIHH")
+TEAM = struct.Struct("<QQ")
+SLOT = struct.Struct("<I")
+GENERATION = struct.Struct("<Q")
+
+# state of this worker
+state: Dict[str, Any] = {
+    "file": None,           # SnapshotFile currently mapped
+    "generation": None,     # mmap of the generation file
+    "building": False,      # a rebuild thread is running
+    "rerun": False,         # another write happened during the rebuild
+    "builds": 0,
+    "build_seconds": 0.0
+}
+lock = threading.Lock()
+
+
+#----- Functions
+def digest(key: bytes) -> int:
+    """Return the 64 bits hash of a key (stable across processes)"""
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+def slots(count: int) -> int:
+    """Return the size of a hash table for a number of records (power of 2, half full at most)"""
+    size = 8
+    while size < count * 2:
+        size <<= 1
+    return size
+
+def path(name: str) -> str:
+    """Return the path of a file within the snapshot directory"""
+    return os.path.join(app.config['PERMISSION_SNAPSHOT_PATH'], name)
+
+
+#----- Class
+class SnapshotFile:
+    """Read-only view of a snapshot file mapped in memory"""
+
+    def __init__(self, filename: str) -> None:
+        """Constructor
+
+        Args:
+            filename: path of the snapshot file
+
+        Raises:
+            'ValueError' if the file is not a snapshot
+        """
+        with open(filename, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.generation,
+         self.user_slots, self.user_count, self.right_slots, self.right_count, self.width, team_count,
+         self.user_slots_offset, self.user_records_offset,
+         self.right_slots_offset, self.right_records_offset, teams_offset, self.keys_offset) = HEADER.unpack_from(self.map, 0)
+
+        if magic != MAGIC:
+            raise ValueError(filename)
+
+        self.versions: Dict[int, int] = dict(TEAM.iter_unpack(self.map[teams_offset:teams_offset + team_count * TEAM.size]))
+        self.size = len(self.map)
+
+    def find(self, key: bytes, slots_offset: int, size: int, records_offset: int, record_size: int) -> Optional[int]:
+        """Find the record of a key in one of the hash tables
+
+        Returns:
+            the offset of the record, None if the key is not in the table
+        """
+        value = digest(key)
+        index = value & (size - 1)
+        while True:
+            (record,) = SLOT.unpack_from(self.map, slots_offset + index * SLOT.size)
+            if record == 0:
+                return None
+
+            offset = records_offset + (record - 1) * record_size
+            hashed, start, length, _ = RECORD.unpack_from(self.map, offset)
+            if (hashed == value) and (self.map[self.keys_offset + start:self.keys_offset + start + length] == key):
+                return offset
+
+            index = (index + 1) & (size - 1)
+
+    def check(self, team_id: int, email: str, right: str) -> Optional[bool]:
+        """Check if a user holds a right within a team
+
+        Returns:
+            True if granted, False if denied, None if the user or the right is unknown
+        """
+        prefix = b"%d\0" % team_id
+
+        user = self.find(prefix + email.encode(), self.user_slots_offset, self.user_slots,
+                         self.user_records_offset, RECORD.size + self.width)
+        if user is None:
+            return None
+
+        offset = self.find(prefix + right.encode(), self.right_slots_offset, self.right_slots,
+                           self.right_records_offset, RECORD.size)
+        if offset is None:
+            return None
+
+        bit = RECORD.unpack_from(self.map, offset)[3]
+        return (self.map[user + RECORD.size + (bit >> 3)] >> (bit & 7)) & 1 == 1
+
+    @staticmethod
+    def pack(generation: int, versions: Dict[int, int], rights: List[Tuple[bytes, int]], users: List[Tuple[bytes, int]], width: int) -> bytearray:
+        """Serialize the users and rights of all the teams
+
+        Args:
+            generation: generation number of the file
+            versions: version of each team, read before the rows
+            rights: list of ("team_id\\0name", bit index)
+            users: list of ("team_id\\0email", bitmask of the rights)
+            width: size in bytes of the bitmasks
+
+        Returns:
+            the content of the file
+        """
+        user_slots, right_slots = slots(len(users)), slots(len(rights))
+        user_record = RECORD.size + width
+
+        user_slots_offset = HEADER.size
+        user_records_offset = user_slots_offset + user_slots * SLOT.size
+        right_slots_offset = user_records_offset + len(users) * user_record
+        right_records_offset = right_slots_offset + right_slots * SLOT.size
+        teams_offset = right_records_offset + len(rights) * RECORD.size
+        keys_offset = teams_offset + len(versions) * TEAM.size
+        size = keys_offset + sum(len(key) for key, _ in users) + sum(len(key) for key, _ in rights)
+
+        data = bytearray(size)
+        HEADER.pack_into(data, 0, MAGIC, generation,
+            user_slots, len(users), right_slots, len(rights), width, len(versions),
+            user_slots_offset, user_records_offset, right_slots_offset, right_records_offset, teams_offset, keys_offset)
+
+        for index, team in enumerate(versions.items()):
+            TEAM.pack_into(data, teams_offset + index * TEAM.size, *team)
+
+        position = 0
+        def table(entries: List[Tuple[bytes, int]], size: int, slots_offset: int, records_offset: int, record_size: int, masks: bool) -> None:
+            nonlocal position
+            for index, (key, value) in enumerate(entries):
+                hashed = digest(key)
+                slot = hashed & (size - 1)
+                while SLOT.unpack_from(data, slots_offset + slot * SLOT.size)[0]:
+                    slot = (slot + 1) & (size - 1)
+                SLOT.pack_into(data, slots_offset + slot * SLOT.size, index + 1)
+
+                offset = records_offset + index * record_size
+                RECORD.pack_into(data, offset, hashed, position, len(key), 0 if masks else value)
+                if masks:
+                    data[offset + RECORD.size:offset + record_size] = value.to_bytes(width, "little")
+
+                data[keys_offset + position:keys_offset + position + len(key)] = key
+                position += len(key)
+
+        table(users, user_slots, user_slots_offset, user_records_offset, user_record, True)
+        table(rights, right_slots, right_slots_offset, right_records_offset, RECORD.size, False)
+
+        return data
+
+
+class SharedSnapshot:
+    """Helper class to write and query the snapshot file shared by the workers
+
+    The file is rebuilt in the background by the worker which handled a write,
+    under an exclusive file lock. Each rebuild is written to a new file named
+    after its generation, then the generation number is stored in a small
+    file mapped by all the workers. A worker compares this number before each
+    check and maps the new file when it changed, without taking any lock.
+
+    The file also holds the version of each team it was built from: until a
+    file built after the last write to a team is published, the workers
+    answer this team (and only this one) from their in-memory snapshots.
+    """
+
+    @staticmethod
+    def rows() -> Tuple[List[Tuple[bytes, int]], List[Tuple[bytes, int]], int]:
+        """Read the users, rights and grants of all the teams
+
+        Returns:
+            the rights, the users with their bitmask and the size of the bitmasks
+        """
+        # the bit index of a right is its rank within the team
+        bits: Dict[int, int] = {}
+        rights: List[Tuple[bytes, int]] = []
+        counts: Dict[int, int] = {}
+        for right_id, team_id, name in db.session.execute(
+            select(Right.id, Right.team_id, Right.name).order_by(Right.team_id, Right.id)
+        ):
+            bit = counts.get(team_id, 0)
+            counts[team_id] = bit + 1
+            bits[right_id] = bit
+            rights.append((b"%d\0%s" % (team_id, name.encode()), bit))
+
+        users: Dict[int, bytes] = {
+            user_id: b"%d\0%s" % (team_id, email.encode())
+            for user_id, team_id, email in db.session.execute(select(User.id, User.team_id, User.email))
+        }
+
+        masks: Dict[int, int] = dict.fromkeys(users, 0)
+        grants = db.session.execute(
+            select(UserRight.user_id, UserRight.right_id)
+            .join(User, User.id == UserRight.user_id)
+            .join(Right, Right.id == UserRight.right_id)
+            .where(User.team_id == Right.team_id)
+        )
+        for user_id, right_id in grants:
+            masks[user_id] |= 1 << bits[right_id]
+
+        width = max(1, (max(counts.values(), default=0) + 7) // 8)
+        return rights, [ (key, masks[user_id]) for user_id, key in users.items() ], width
+
+    @staticmethod
+    def generation() -> int:
+        """Return the generation number published in the generation file (0 if none)"""
+        try:
+            with open(path("generation"), "rb") as f:
+                data = f.read(GENERATION.size)
+        except FileNotFoundError:
+            return 0
+
+        return GENERATION.unpack(data)[0] if len(data) == GENERATION.size else 0
+
+    @staticmethod
+    def write() -> int:
+        """Write a new snapshot file and publish its generation
+
+        Nothing is written if the published file is already up to date.
+
+        Returns:
+            the generation number of the published file
+        """
+        os.makedirs(app.config['PERMISSION_SNAPSHOT_PATH'], exist_ok=True)
+
+        with open(path("lock"), "a") as writer:
+            # a single writer at a time across the workers
+            fcntl.flock(writer, fcntl.LOCK_EX)
+
+            # the versions and the rows are read within the same transaction
+            generation = SharedSnapshot.generation()
+            versions = Versions.all()
+            try:
+                if SnapshotFile(path("%d.snapshot" % generation)).versions == versions:
+                    return generation
+            except (FileNotFoundError, ValueError):
+                pass
+
+            generation += 1
+            rights, users, width = SharedSnapshot.rows()
+            data = SnapshotFile.pack(generation, versions, rights, users, width)
+
+            filename = path("%d.snapshot" % generation)
+            with open(filename + ".tmp", "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(filename + ".tmp", filename)
+
+            # the generation file keeps the same inode so the workers can keep it mapped
+            fd = os.open(path("generation"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < GENERATION.size:
+                    os.ftruncate(fd, GENERATION.size)
+                os.pwrite(fd, GENERATION.pack(generation), 0)
+            finally:
+                os.close(fd)
+
+            # the older files stay readable by the workers which still map them
+            for name in glob.glob(path("*.snapshot")):
+                if name != filename:
+                    os.unlink(name)
+
+        return generation
+
+    @staticmethod
+    def current() -> SnapshotFile:
+        """Return the snapshot file of the latest generation, mapped on first use"""
+        generation = state["generation"]
+        if generation is None:
+            if SharedSnapshot.generation() == 0:
+                SharedSnapshot.write()
+
+            with open(path("generation"), "rb") as f:
+                generation = mmap.mmap(f.fileno(), GENERATION.size, access=mmap.ACCESS_READ)
+            state["generation"] = generation
+
+        snapshot = state["file"]
+        number = GENERATION.unpack_from(generation, 0)[0]
+        if (snapshot is None) or (snapshot.generation != number):
+            try:
+                snapshot = SnapshotFile(path("%d.snapshot" % number))
+            except FileNotFoundError:
+                # already replaced by a newer generation, read again
+                return SharedSnapshot.current()
+
+            # the previous file is unmapped once the requests still using it are done
+            state["file"] = snapshot
+
+        return snapshot
+
+    @staticmethod
+    def check(team_id: int, email: str, right: str, version: int) -> Optional[bool]:
+        """Check if a user holds a right within a team
+
+        The file is used only if it was built from the current version of the
+        team (or a newer one), otherwise a rebuild is scheduled and the team is
+        answered from the in-memory snapshot of this worker.
+
+        Args:
+            team_id: ID of the team
+            email: email of the user
+            right: name of the right
+            version: current version of the team
+
+        Returns:
+            True if granted, False if denied, None if the user or the right is unknown
+        """
+        snapshot = SharedSnapshot.current()
+        if snapshot.versions.get(team_id, 0) < version:
+            SharedSnapshot.schedule()
+            return Snapshot.check(team_id, email, right, version)
+
+        return snapshot.check(team_id, email, right)
+
+    @staticmethod
+    def invalidate(team_id: Optional[int] = None) -> None:
+        """Schedule the rebuild of the file after a write
+
+        Args:
+            team_id: ID of the team whose users/rights changed, all the teams if None
+        """
+        SharedSnapshot.schedule()
+
+    @staticmethod
+    def schedule() -> None:
+        """Start the rebuild thread of this worker, or ask it for one more run"""
+        with lock:
+            if state["building"]:
+                state["rerun"] = True
+                return
+            state["building"] = True
+
+        threading.Thread(target=SharedSnapshot.rebuild, daemon=True).start()
+
+    @staticmethod
+    def rebuild() -> None:
+        """Rebuild the file until no write happened in the meantime (runs in a thread)"""
+        while True:
+            start = time.monotonic()
+            try:
+                with app.app_context():
+                    SharedSnapshot.write()
+                    db.session.remove()
+
+                with lock:
+                    state["builds"] += 1
+                    state["build_seconds"] = time.monotonic() - start
+
+            except Exception as e:
+                app.logger.error(getMessage(0x0005, error=str(e)))
+
+            with lock:
+                if not state["rerun"]:
+                    state["building"] = False
+                    return
+                state["rerun"] = False
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        """Return the size and the generation of the mapped file"""
+        snapshot = state["file"]
+        return {
+            "generation": snapshot.generation if snapshot else None,
+            "bytes": snapshot.size if snapshot else 0,
+            "users": snapshot.user_count if snapshot else 0,
+            "rights": snapshot.right_count if snapshot else 0,
+            "teams": len(snapshot.versions) if snapshot else 0,
+            "builds": state["builds"],
+            "build_seconds": round(state["build_seconds"], 3)
+        }
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Compiled per-team snapshot of the users / rights associations
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Dict, Optional
+
+import time
+
+from sqlalchemy import select
+
+from app import app, db
+from app.models import (
+    User, Right, UserRight
+)
+
+from .cache import Generations
+from .flight import SingleFlight
+
+
+#----- Globals
+# snapshot of each team indexed by team_id
+teams: Dict[int, TeamSnapshot] = {}
+
+# concurrent builds of the same team share one execution
+flights = SingleFlight()
+
+# a build which started before an invalidation of its team is not stored
+generations = Generations()
+
+
+#----- Class
+class TeamSnapshot:
+    """Bit matrix of the users x rights of one team"""
+
+    __slots__ = ("rights", "users", "version", "expiry")
+
+    def __init__(self, rights: Dict[str, int], users: Dict[str, int], version: int, expiry: float) -> None:
+        """Constructor
+
+        Args:
+            rights: bit index of each right name
+            users: bitmask of the rights granted to each email
+            version: version of the team read before the build
+            expiry: monotonic time after which the snapshot is rebuilt
+        """
+        self.rights = rights
+        self.users = users
+        self.version = version
+        self.expiry = expiry
+
+    def check(self, email: str, right: str) -> Optional[bool]:
+        """Check if a user holds a right
+
+        Returns:
+            True if granted, False if denied, None if the user or the right is unknown
+        """
+        mask = self.users.get(email)
+        bit = self.rights.get(right)
+        if (mask is None) or (bit is None):
+            return None
+
+        return (mask >> bit) & 1 == 1
+
+
+class Snapshot:
+    """Helper class to build and query the per-team snapshots"""
+
+    @staticmethod
+    def build(team_id: int, version: int) -> TeamSnapshot:
+        """Compile the snapshot of a team
+
+        Args:
+            team_id: ID of the team
+            version: version of the team, read before the build
+
+        Returns:
+            the snapshot of the team
+        """
+        # the bit index of a right is its rank within the team
+        bits: Dict[int, int] = {}
+        rights: Dict[str, int] = {}
+        for index, (right_id, name) in enumerate(db.session.execute(
+            select(Right.id, Right.name).where(Right.team_id == team_id).order_by(Right.id)
+        )):
+            bits[right_id] = index
+            rights[name] = index
+
+        emails: Dict[int, str] = dict(db.session.execute(
+            select(User.id, User.email).where(User.team_id == team_id)
+        ).all())
+
+        # the associations are read from the (right_id, user_id) covering index
+        masks: Dict[int, int] = dict.fromkeys(emails, 0)
+        grants = db.session.execute(
+            select(UserRight.user_id, UserRight.right_id)
+            .where(UserRight.right_id.in_(select(Right.id).where(Right.team_id == team_id)))
+        )
+        for user_id, right_id in grants:
+            if user_id in masks:
+                masks[user_id] |= 1 << bits[right_id]
+
+        users: Dict[str, int] = { email: masks[user_id] for user_id, email in emails.items() }
+
+        return TeamSnapshot(rights, users, version, time.monotonic() + app.config['PERMISSION_CACHE_TTL'])
+
+    @staticmethod
+    def team(team_id: int, version: int) -> TeamSnapshot:
+        """Retrieve the snapshot of a team, (re)built if missing, expired or older than the team
+
+        Args:
+            team_id: ID of the team
+            version: current version of the team
+
+        Returns:
+            the snapshot of the team
+        """
+        snapshot = teams.get(team_id)
+        if (snapshot is None) or (snapshot.version != version) or (snapshot.expiry < time.monotonic()):
+            generation = generations.get(team_id)
+            snapshot = flights.do((team_id, version), lambda: Snapshot.build(team_id, version))
+            if generations.get(team_id) == generation:
+                teams[team_id] = snapshot
+
+        return snapshot
+
+    @staticmethod
+    def check(team_id: int, email: str, right: str, version: int) -> Optional[bool]:
+        """Check if a user holds a right within a team
+
+        Returns:
+            True if granted, False if denied, None if the user or the right is unknown
+        """
+        return Snapshot.team(team_id, version).check(email, right)
+
+    @staticmethod
+    def invalidate(team_id: Optional[int] = None) -> None:
+        """Drop the snapshot of a team after a write, it is rebuilt on the next check
+
+        Args:
+            team_id: ID of the team whose users/rights changed, all the teams if None
+        """
+        generations.bump(team_id)
+        flights.forget()
+        if team_id is None:
+            teams.clear()
+        else:
+            teams.pop(team_id, None)
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        """Return the size of the snapshots"""
+        snapshots = list(teams.values())
+        return {
+            "teams": len(snapshots),
+            "users": sum(len(snapshot.users) for snapshot in snapshots),
+            "rights": sum(len(snapshot.rights) for snapshot in snapshots),
+            "grants": sum(bin(mask).count("1") for snapshot in snapshots for mask in snapshot.users.values()),
+            "flights": flights.stats()
+        }
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Class to decode the JSON Web Tokens issued by /auth
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Dict, Optional
+
+import jwt
+import time
+import hashlib
+import datetime
+
+from app import app
+
+from .cache import LRUCache
+
+
+#----- Globals
+# verified claims indexed by the digest of the token
+tokens = LRUCache(app.config['TOKEN_CACHE_SIZE'], app.config['TOKEN_EXPIRY_MINUTES'] * 60)
+
+# last token issued for each software, kept while it can be reused
+issued = LRUCache(app.config['TOKEN_CACHE_SIZE'], app.config['TOKEN_EXPIRY_MINUTES'] * 60)
+
+
+#----- Class
+class Token:
+    """Helper class to verify the JSON Web Tokens"""
+
+    @staticmethod
+    def decode(value: str) -> Dict[str, Any]:
+        """Verify a token and return its claims
+
+        The signature of a token is verified only once per worker, the claims
+        are then kept in memory until the token expires.
+
+        Args:
+            value: the encoded token
+
+        Raises:
+            jwt.InvalidTokenError (and subclasses) if the token cannot be verified
+
+        Returns:
+            the claims contained in the token
+        """
+        digest = hashlib.sha256(value.encode()).digest()
+
+        claims = tokens.get(digest)
+        if claims is LRUCache.MISSING:
+            claims = jwt.decode(value, app.config['DUDE_SECRET_KEY'], "HS256")
+
+            # keep the claims until the token expires
+            ttl = claims['exp'] - time.time()
+            if ttl > 0:
+                tokens.set(digest, claims, ttl)
+
+        return claims
+
+    @staticmethod
+    def issue(software: Any) -> str:
+        """Issue a token for a software
+
+        The token previously issued for the same software is handed back as long
+        as at least TOKEN_REUSE_MIN_MINUTES remain before it expires. It is
+        indexed by the apikey, name and team of the row: Credentials.lookup
+        reads the row again once any worker changed a software, so a token
+        is never handed back for an older team or apikey.
+
+        Args:
+            software: the software as returned by Credentials.lookup
+
+        Returns:
+            the encoded token
+        """
+        # any change of the apikey, name or team makes the previous token unusable
+        key = (software.id, software.apikey, software.name, software.team_id)
+
+        token = issued.get(key)
+        if token is not LRUCache.MISSING:
+            return token
+
+        # issue at and expiry time
+        iat = datetime.datetime.utcnow()
+        exp = iat + datetime.timedelta(minutes=app.config['TOKEN_EXPIRY_MINUTES'])
+
+        # generate a new JSON Web Token
+        payload = {
+            'apikey': software.apikey,
+            'name': software.name,
+            'team_id': f"{software.team_id}",
+            'iat': iat.timestamp(),
+            'exp': exp.timestamp()
+        }
+
+        token = jwt.encode(payload, app.config['DUDE_SECRET_KEY'], "HS256")
+
+        # the token is reusable until less than TOKEN_REUSE_MIN_MINUTES remain
+        reuse = (app.config['TOKEN_EXPIRY_MINUTES'] - app.config['TOKEN_REUSE_MIN_MINUTES']) * 60
+        if reuse > 0:
+            issued.set(key, token, reuse)
+
+        return token
+
+    @staticmethod
+    def revoke(software_id: Optional[int] = None) -> None:
+        """Stop reusing the token issued for a software
+
+        Args:
+            software_id: ID of the software, all the software if None
+        """
+        if software_id is None:
+            issued.invalidate()
+        else:
+            issued.invalidate(lambda key: key[0] == software_id)
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        """Return the counters of the tokens caches"""
+        return {
+            "verified": tokens.stats(),
+            "issued": issued.stats()
+        }
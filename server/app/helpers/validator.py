@@ -17,6 +17,8 @@ from typing import Any, List, Dict, Tuple
 
 from flask import Request
 
+from .http_response import Serializer
+
 
 #----- Class
 
@@ -38,6 +40,28 @@ class Validator:
             if field not in input:
                 raise KeyError(field)
 
+    @staticmethod
+    def body(request: Request) -> Any:
+        """Decode the body of a request according to its Content-Type (JSON or MessagePack)
+
+        Args:
+            request: the HTTP request
+
+        Raises:
+            'BadRequest' if the body cannot be decoded
+            'UnsupportedMediaType' if MessagePack is sent but not available
+
+        Returns:
+            the decoded body, an empty dict if the request has no body
+        """
+        if int(request.headers.get('Content-Length', 0)) <= 0:
+            return {}
+
+        if request.mimetype == Serializer.MSGPACK:
+            return Serializer.loads(request.get_data())
+
+        return request.get_json()
+
     @staticmethod
     def parameters(request: Request, fields: List[Tuple[str, Any]]):
         """Validate input parameters from query
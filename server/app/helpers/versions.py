@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Versions of the users / rights / grants of each team
+
+#----- Imports
+from __future__ import annotations
+from typing import Dict, Optional, Tuple
+
+import time
+
+from app import app, db
+from app.models import TeamVersion
+
+from .cache import Generations
+
+
+#----- Globals
+# version of each team read by this worker, with the monotonic time until which it is trusted
+teams: Dict[int, Tuple[int, float]] = {}
+
+# a version read before an invalidation of its team is not kept
+generations = Generations()
+
+
+#----- Class
+class Versions:
+    """Helper class to read the versions of the teams
+
+    The version of a team is bumped by the database triggers in the same
+    transaction as any write to its users, rights or grants, whichever the
+    worker. The snapshots and caches built from an older version of their
+    team are rebuilt, the other teams are not affected.
+    """
+
+    @staticmethod
+    def team(team_id: int) -> int:
+        """Return the version of a team, read at most once per PERMISSION_VERSION_INTERVAL
+
+        Args:
+            team_id: ID of the team
+
+        Returns:
+            the version of the team (0 for a team never written)
+        """
+        item = teams.get(team_id)
+        now = time.monotonic()
+        if (item is not None) and (item[1] > now):
+            return item[0]
+
+        # plain SQL on the connection of the session skips the ORM compilation
+        generation = generations.get(team_id)
+        version = db.session.connection().exec_driver_sql(
+            f"SELECT version FROM {TeamVersion.__tablename__} WHERE team_id = ?", (team_id,)
+        ).scalar() or 0
+
+        if generations.get(team_id) == generation:
+            teams[team_id] = (version, now + app.config['PERMISSION_VERSION_INTERVAL'])
+
+        return version
+
+    @staticmethod
+    def all() -> Dict[int, int]:
+        """Read the versions of all the teams written at least once (no cache)"""
+        return dict(db.session.connection().exec_driver_sql(
+            f"SELECT team_id, version FROM {TeamVersion.__tablename__}"
+        ).all())
+
+    @staticmethod
+    def forget(team_id: Optional[int] = None) -> None:
+        """Read again the version of a team on its next check (after a write in this worker)
+
+        Args:
+            team_id: ID of the team, all the teams if None
+        """
+        generations.bump(team_id)
+        if team_id is None:
+            teams.clear()
+        else:
+            teams.pop(team_id, None)
@@ -22,6 +22,9 @@ messages: Dict[int, str] = {
     # 0xxxh: Admin messages
     0x0001: "X-API-TOKEN for administrative endpoints is [{apikey}].",
     0x0002: "DUDE_SECRET_KEY is not defined. Please fix this and restart.",
+    0x0003: "Could not create index '{name}': {error}",
+    0x0004: "Deleted rows: {report}.",
+    0x0005: "Could not write the permission snapshot: {error}",
 
     # 1xxxh: HTTP 1xx messages
 
@@ -40,6 +43,7 @@ messages: Dict[int, str] = {
     0x4004: "Field '{name}' cannot be converted to a '{type}'.",
     0x4005: "Not able to update field '{name}'.",
     0x4006: "Association not authorized between two different teams.",
+    0x4007: "Field '{name}' contains too many items (maximum is {max}).",
 
     ## 401x: Unauthorized (ie unauthenticated)
     0x4010: "Token has expired.",
@@ -12,22 +12,50 @@
 # @brief	DUDE database model
 
 #----- Imports
+import hashlib
+
+from sqlalchemy.orm import validates
+
 from app import db
 
 #----- Classes
+
+# the version of each row is incremented by the ORM on every update (ETag of the single GET)
+# the ids are never reused (AUTOINCREMENT), so a record created again has a new ETag
 class Company(db.Model):
+    __table_args__ = { 'sqlite_autoincrement': True }
+
     id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = { 'version_id_col': version }
+
     name = db.Column(db.String(128), index=True, nullable=False, unique=True)
     units = db.relationship('Unit', cascade="all,delete", backref='company', lazy='dynamic')
 
 class Unit(db.Model):
+    __table_args__ = (
+        db.Index('ix_unit_company_id_name', 'company_id', 'name'),
+        { 'sqlite_autoincrement': True }
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = { 'version_id_col': version }
+
     name = db.Column(db.String(128), index=True, nullable=False)
     company_id = db.Column(db.Integer, db.ForeignKey('company.id'))
     teams = db.relationship('Team', cascade="all,delete", backref='unit', lazy='dynamic')
 
 class Team(db.Model):
+    __table_args__ = (
+        db.Index('ix_team_unit_id_name', 'unit_id', 'name'),
+        { 'sqlite_autoincrement': True }
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = { 'version_id_col': version }
+
     name = db.Column(db.String(128), index=True, nullable=False)
     unit_id = db.Column(db.Integer, db.ForeignKey('unit.id'))
 
@@ -36,24 +64,110 @@ class Team(db.Model):
     software = db.relationship('Software', cascade="all,delete", backref='team', lazy='dynamic')
 
 class User(db.Model):
+    __table_args__ = (
+        db.Index('ix_user_team_id_email', 'team_id', 'email'),
+        { 'sqlite_autoincrement': True }
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = { 'version_id_col': version }
+
     name = db.Column(db.String(128), index=True, nullable=False)
     email = db.Column(db.String(255), index=True, nullable=False, unique=True)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
 
 class Right(db.Model):
+    __table_args__ = (
+        db.Index('ix_right_team_id_name', 'team_id', 'name'),
+        { 'sqlite_autoincrement': True }
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = { 'version_id_col': version }
+
     name = db.Column(db.String(128), index=True, nullable=False)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
 
 class Software(db.Model):
+    __table_args__ = (
+        db.Index('ix_software_team_id_name', 'team_id', 'name'),
+        { 'sqlite_autoincrement': True }
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = { 'version_id_col': version }
+
     name = db.Column(db.String(128), index=True, nullable=False)
     apikey = db.Column(db.String(128), nullable=False, unique=True)
+    apikey_digest = db.Column(db.LargeBinary(32), index=True, unique=True)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
 
+    @staticmethod
+    def digest(apikey: str) -> bytes:
+        """Return the fixed-width digest used to look up an apikey"""
+        return hashlib.sha256(apikey.encode()).digest()
+
+    @validates('apikey')
+    def validate_apikey(self, key, apikey):
+        # keep the digest in sync with the apikey
+        self.apikey_digest = Software.digest(apikey)
+        return apikey
 
 class UserRight(db.Model):
+    __table_args__ = (
+        db.Index('ix_user_right_user_id_right_id', 'user_id', 'right_id', unique=True),
+        db.Index('ix_user_right_right_id_user_id', 'right_id', 'user_id'),
+        { 'sqlite_autoincrement': True }
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = { 'version_id_col': version }
+
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     right_id = db.Column(db.Integer, db.ForeignKey('right.id'))
+
+class TableVersion(db.Model):
+    """Change counter of each table (ETag of the list GET)"""
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class TeamVersion(db.Model):
+    """Change counter of the users, rights and grants of each team (maintained by TEAM_VERSION_TRIGGERS)"""
+    team_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+#----- Globals
+
+# the teams a row of these tables belongs to, as seen from a trigger ({row} is OLD or NEW)
+TEAMS_OF_ROW = {
+    'user': "SELECT {row}.team_id AS team_id",
+    'right': "SELECT {row}.team_id AS team_id",
+    'user_right': 'SELECT team_id FROM user WHERE id = {row}.user_id UNION SELECT team_id FROM "right" WHERE id = {row}.right_id'
+}
+
+# the columns whose update changes the answers of /validate
+WATCHED_COLUMNS = {
+    'user': "email, team_id",
+    'right': "name, team_id",
+    'user_right': "user_id, right_id"
+}
+
+# every write to the users, rights or grants of a team bumps its version in the same transaction,
+# whichever the process, the connection or the statement (ORM, bulk or raw SQL)
+TEAM_VERSION_TRIGGERS = {
+    f"team_version_{table}_{action.lower()}": (
+        f'CREATE TRIGGER IF NOT EXISTS team_version_{table}_{action.lower()} '
+        f'AFTER {action}{" OF " + WATCHED_COLUMNS[table] if action == "UPDATE" else ""} ON "{table}" BEGIN '
+        f'INSERT INTO team_version (team_id, version) '
+        f'SELECT team_id, 1 FROM ({" UNION ".join(TEAMS_OF_ROW[table].format(row=row) for row in rows)}) WHERE team_id IS NOT NULL '
+        f'ON CONFLICT (team_id) DO UPDATE SET version = version + 1; '
+        f'END'
+    )
+    for table in TEAMS_OF_ROW
+    for action, rows in (("INSERT", ["NEW"]), ("DELETE", ["OLD"]), ("UPDATE", ["OLD", "NEW"]))
+}
@@ -12,11 +12,70 @@
 # @brief	Gunicorn configuration file
 
 #----- Imports
+import multiprocessing
 import os
 import ssl
 
 
+#----- Functions
+def setting(name: str, default, cast=str):
+    """Return the value of a setting from DUDE_GUNICORN_<NAME>, the profile or the default"""
+    value = os.environ.get(f"DUDE_GUNICORN_{name.upper()}")
+    if value is None:
+        return PROFILES[profile].get(name, default)
+
+    if cast is bool:
+        return value.lower() in ("1", "true", "yes", "on")
+
+    return cast(value)
+
+def post_fork(server, worker):
+    """Open new SQLite connections in each worker, those of the master cannot be shared"""
+    if preload_app:
+        from app import db
+        db.engine.dispose()
+
+
 #----- Globals
+# preset profiles, each value can still be overridden by its environment variable
+cpus = multiprocessing.cpu_count()
+PROFILES = {
+    # gunicorn defaults: one sync worker
+    "": {},
+
+    # many short read-only requests (/auth, /validate) served from the in-memory caches:
+    # threads keep the connections alive, the workers are recycled rarely to keep their caches warm
+    "validation-heavy": {
+        'workers': cpus * 2 + 1,
+        'threads': 4,
+        'worker_class': "gthread",
+        'max_requests': 100000,
+        'max_requests_jitter': 10000,
+        'preload_app': True,
+        'keepalive': 5,
+        'backlog': 2048,
+        'timeout': 30
+    },
+
+    # fewer, longer requests (imports, exports, trees) with writes serialized by SQLite anyway:
+    # the workers are recycled often to release the memory of the large payloads
+    "admin-heavy": {
+        'workers': cpus + 1,
+        'threads': 2,
+        'worker_class': "gthread",
+        'max_requests': 1000,
+        'max_requests_jitter': 100,
+        'preload_app': False,
+        'keepalive': 2,
+        'backlog': 512,
+        'timeout': 120
+    }
+}
+
+profile = os.environ.get("DUDE_GUNICORN_PROFILE", "")
+if profile not in PROFILES:
+    raise ValueError(f"DUDE_GUNICORN_PROFILE must be one of: {', '.join(name for name in PROFILES if name)}")
+
 ## Debugging
 reload = False
 reload_engine = 'auto'
@@ -29,30 +88,41 @@ print_config = False
 
 ## SSL
 basedir = os.path.dirname(__file__)
-certsdir = os.path.join(basedir, "../certs")
+certsdir = os.environ.get("DUDE_CERTS_DIR", os.path.join(basedir, "../certs"))
 
-keyfile = os.path.join(certsdir, "my_dev_site.key.pem")
+keyfile = os.environ.get("DUDE_SSL_KEYFILE", os.path.join(certsdir, "my_dev_site.key.pem"))
 if not os.path.exists(keyfile):
     keyfile = None
 
-certfile = os.path.join(certsdir, "my_dev_site.cert.pem")
+certfile = os.environ.get("DUDE_SSL_CERTFILE", os.path.join(certsdir, "my_dev_site.cert.pem"))
 if not os.path.exists(certfile):
     certfile = None
 
 ssl_version = ssl.PROTOCOL_TLS
 
 # cert_reqs = None
-# ca_certs = None
+ca_certs = os.environ.get("DUDE_SSL_CA_CERTS", None)
 # suppress_ragged_eofs = True
 # do_handshake_on_connect = False
 # ciphers = None
 
+## Worker Processes
+workers = setting('workers', 1, int)
+threads = setting('threads', 1, int)
+worker_class = setting('worker_class', "sync")
+max_requests = setting('max_requests', 0, int)
+max_requests_jitter = setting('max_requests_jitter', 0, int)
+keepalive = setting('keepalive', 2, int)
+timeout = setting('timeout', 30, int)
+
 ## Server Mechanics
+preload_app = setting('preload_app', False, bool)
 reuse_port = True
 daemon = False
 
 ## Server Socket
-bind = ['localhost:5000']
+bind = setting('bind', "localhost:5000").split(",")
+backlog = setting('backlog', 2048, int)
 
 # default application
 wsgi_app = "wsgi:app"
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Benchmark: encoders of the responses on the company, user and user-right lists
+#
+# $ python -m pytest tests/bench_encoders.py -s
+
+#----- Imports
+import json
+
+import pytest
+
+from app import app
+from app.helpers.http_response import dumpsJSON, dumpsORJSON, packMSGPACK, orjson, msgpack
+
+from conftest import call, measure, seed
+
+
+#----- Globals
+# encoders available here, the first one is the former path (jsonify, Response included)
+ENCODERS = {
+    "flask (jsonify)": lambda value: app.json.response(value).get_data(),
+    "json (compact)": dumpsJSON,
+    **({ "orjson": dumpsORJSON } if orjson is not None else {}),
+    **({ "msgpack": packMSGPACK } if msgpack is not None else {})
+}
+
+
+#----- Fixtures
+@pytest.fixture(scope="module")
+def payloads():
+    """Pages of 100 records read from the list endpoints (administrative synchronisation)"""
+    for _ in range(100):
+        seed()
+
+    return { url: call("GET", f"{url}?limit=100&sync=1").get_json() for url in ("/companies", "/users", "/user-rights") }
+
+
+#----- Tests
+@pytest.mark.parametrize("url", [ "/companies", "/users", "/user-rights" ])
+def test_encoders(payloads, url):
+    value = payloads[url]
+    assert value["count"] == 100
+
+    print(f"\n{url}: {len(dumpsJSON(value))} bytes")
+    reference = None
+    for name, encode in ENCODERS.items():
+        elapsed = measure(lambda: encode(value), 500)
+        reference = reference or elapsed
+        print(f"  {name:16}: {elapsed:8.2f} us  (x{reference / elapsed:.1f})  {len(encode(value))} bytes")
+
+    # the compact encoders give the same document
+    assert json.loads(dumpsJSON(value)) == value
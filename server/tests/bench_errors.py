@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Benchmark: prebuilt error responses against the formatted ones
+#
+# $ python -m pytest tests/bench_errors.py -s
+
+#----- Imports
+import pytest
+
+from flask import jsonify, make_response
+
+from app import app
+from app.helpers import HTTPResponse
+from app.localization import getMessage
+
+from conftest import measure
+
+
+#----- Functions
+def formatted(code, **kwargs):
+    """The error path before the prebuilt responses: status decoded, message formatted, jsonify"""
+    d1 = (code >> 4) & 0x0f
+    d2 = (code >> 8) & 0x0f
+    d3 = (code >> 12) & 0x0f
+    http_code = int(f"{d3}{d2}{d1}")
+
+    value = jsonify({
+        "error": {
+            "code": f"{http_code}",
+            "message": getMessage(code, **kwargs)
+        }
+    })
+
+    response = make_response(value, http_code)
+    return HTTPResponse.headers(response)
+
+
+#----- Tests
+@pytest.mark.parametrize("code", [ 0x4010, 0x4011, 0x4030, 0x4050 ])
+def test_error(code):
+    with app.test_request_context("/validate", method="POST"):
+        assert formatted(code).get_json() == HTTPResponse.error(code).get_json()
+
+        before = measure(lambda: formatted(code), 5000)
+        after = measure(lambda: HTTPResponse.error(code), 5000)
+
+    # the Response object itself is built on both paths
+    print(f"\n0x{code:x} formatted: {before:6.2f} us, prebuilt: {after:6.2f} us (x{before / after:.1f})")
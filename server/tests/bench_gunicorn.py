@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Load test: throughput of each gunicorn profile
+#
+# $ python -m pytest tests/bench_gunicorn.py -s
+#
+# DUDE_BENCH_CLIENTS (default 16) concurrent keep-alive clients send requests
+# for DUDE_BENCH_SECONDS (default 3) seconds to a gunicorn started with each
+# profile on the test database. The workers of the profiles only make a
+# difference with several CPUs (the clients run on the same machine). The
+# connections of a recycled worker (max_requests) are counted as errors.
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from app import app
+
+from conftest import HEADERS
+
+
+#----- Globals
+CLIENTS = int(os.environ.get("DUDE_BENCH_CLIENTS", 16))
+SECONDS = float(os.environ.get("DUDE_BENCH_SECONDS", 3))
+
+# gunicorn started from the server directory (gunicorn.conf.py) on the database of the tests
+BOOT = """
+import sys
+from app import app
+app.config['SQLALCHEMY_DATABASE_URI'] = sys.argv[1]
+app.config['PERMISSION_SNAPSHOT_PATH'] = sys.argv[2]
+
+from gunicorn.app.wsgiapp import run
+sys.argv = [ "gunicorn" ]
+run()
+"""
+
+
+#----- Functions
+def port() -> int:
+    """Return a free TCP port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def send(connection: http.client.HTTPConnection, method: str, url: str, body: Optional[Dict[str, Any]], headers: Dict[str, str]) -> int:
+    """Send a request on a keep-alive connection and read the whole answer"""
+    connection.request(method, url, body=None if body is None else json.dumps(body),
+                       headers=dict(headers, **{ "Content-Type": "application/json" }))
+    response = connection.getresponse()
+    response.read()
+    return response.status
+
+def load(address: Tuple[str, int], method: str, url: str, body: Optional[Dict[str, Any]], headers: Dict[str, str]) -> Tuple[float, int]:
+    """Send the same request from CLIENTS threads during SECONDS
+
+    Returns:
+        the number of requests per second and the number of errors
+    """
+    counts = [ 0 ] * CLIENTS
+    errors = [ 0 ] * CLIENTS
+    stop = time.monotonic() + SECONDS
+
+    def client(index: int) -> None:
+        connection = http.client.HTTPConnection(*address)
+        while time.monotonic() < stop:
+            try:
+                if send(connection, method, url, body, headers) != 200:
+                    errors[index] += 1
+                counts[index] += 1
+            except (OSError, http.client.HTTPException):
+                errors[index] += 1
+                connection.close()
+                connection = http.client.HTTPConnection(*address)
+        connection.close()
+
+    threads = [ threading.Thread(target=client, args=(index,)) for index in range(CLIENTS) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return sum(counts) / SECONDS, sum(errors)
+
+
+#----- Fixtures
+@pytest.fixture(params=[ "", "validation-heavy", "admin-heavy" ])
+def server(request, tmp_path) -> Iterator[Tuple[str, Tuple[str, int]]]:
+    """A gunicorn started with a profile, stopped after the test"""
+    pytest.importorskip("gunicorn")
+
+    address = ("127.0.0.1", port())
+    env = dict(os.environ,
+        DUDE_GUNICORN_PROFILE=request.param,
+        DUDE_GUNICORN_BIND=f"{address[0]}:{address[1]}",
+        DUDE_CERTS_DIR=str(tmp_path)
+    )
+    process = subprocess.Popen(
+        [ sys.executable, "-c", BOOT, app.config['SQLALCHEMY_DATABASE_URI'], str(tmp_path / "snapshot") ],
+        cwd=os.path.join(os.path.dirname(__file__), ".."), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    try:
+        # wait for the workers
+        deadline = time.monotonic() + 30
+        while True:
+            connection = http.client.HTTPConnection(*address, timeout=1)
+            try:
+                if send(connection, "GET", "/version", None, {}) == 200:
+                    break
+            except OSError:
+                pass
+            finally:
+                connection.close()
+            assert (process.poll() is None) and (time.monotonic() < deadline), "gunicorn did not start"
+            time.sleep(0.2)
+
+        yield request.param or "(default)", address
+
+    finally:
+        process.terminate()
+        process.wait(30)
+
+
+#----- Tests
+def test_profile(server, team):
+    profile, address = server
+    validate = { "token": team["token"], "email": team["john"], "right": "read" }
+
+    rate, errors = load(address, "POST", "/validate", validate, {})
+    print(f"\n{profile:17} /validate   : {rate:8.0f} req/s ({errors} errors)")
+
+    rate, errors = load(address, "GET", f"/teams/{team['team']}/users", None, HEADERS)
+    print(f"{profile:17} /teams/users: {rate:8.0f} req/s ({errors} errors)")
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Benchmark: CPU saved by the cache of the verified tokens
+#
+# $ python -m pytest tests/bench_token.py -s
+
+#----- Imports
+import jwt
+
+from app import app
+from app.helpers import Token
+from app.helpers.token import tokens
+
+from conftest import call, measure
+
+
+#----- Tests
+def test_decode(team):
+    value = team["token"]
+
+    verify = measure(lambda: jwt.decode(value, app.config['DUDE_SECRET_KEY'], "HS256"))
+    cached = measure(lambda: Token.decode(value))
+
+    print(f"\njwt.decode (HS256 + JSON): {verify:8.2f} us")
+    print(f"Token.decode (cached)    : {cached:8.2f} us  ({verify - cached:.2f} us saved per request)")
+    assert cached < verify
+
+def test_validate(team):
+    data = { "token": team["token"], "email": team["john"], "right": "read" }
+
+    def cold():
+        tokens.invalidate()
+        call("POST", "/validate", data, None)
+
+    verify = measure(cold, 500)
+    cached = measure(lambda: call("POST", "/validate", data, None), 500)
+
+    print(f"\n/validate, token verified   : {verify:8.2f} us")
+    print(f"/validate, token from cache : {cached:8.2f} us  ({verify - cached:.2f} us saved per request)")
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Test fixtures: a temporary database and a seeded team
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import itertools
+import os
+import sys
+import tempfile
+import timeit
+
+import pytest
+from sqlalchemy import event
+
+# the application reads its configuration when it is imported
+os.environ.setdefault("DUDE_SECRET_KEY", "dude-tests")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import app, db
+
+tmpdir = tempfile.mkdtemp(prefix="dude-tests-")
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tmpdir, "dude.sqlite")
+app.config['PERMISSION_SNAPSHOT_PATH'] = os.path.join(tmpdir, "snapshot")
+
+import wsgi     # noqa: F401 (creates the tables)
+
+
+#----- Globals
+HEADERS = { "X-API-Token": app.config['DUDE_SECRET_KEY'] }
+
+# unique names for the records of each test
+sequence = itertools.count(1)
+
+
+#----- Functions
+def call(method: str, url: str, json: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = HEADERS) -> Any:
+    """Dispatch a request to the application and return its response"""
+    with app.test_request_context(url, method=method, json=json, headers=headers or {}):
+        return app.full_dispatch_request()
+
+def measure(function: Callable[[], Any], number: int = 2000) -> float:
+    """Return the time of one call in microseconds (best of 5 rounds, for the benchmarks)"""
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e6
+
+def plan(statement: str, parameters: Any) -> List[str]:
+    """Return the details of the SQLite query plan of a statement"""
+    # the DBAPI connection is used directly so the plans are not recorded as statements
+    connection = db.engine.raw_connection()
+    try:
+        return [ row[3] for row in connection.cursor().execute("EXPLAIN QUERY PLAN " + statement, parameters) ]
+    finally:
+        connection.close()
+
+def seed() -> Dict[str, Any]:
+    """Create a company with one team, two users, two rights, one grant each and a software"""
+    n = next(sequence)
+
+    company = call("POST", "/companies", { "name": f"ACME {n}" }).get_json()["id"]
+    unit = call("POST", f"/companies/{company}/units", { "name": "IT" }).get_json()["id"]
+    team = call("POST", "/teams", { "name": "Ops", "unit_id": unit }).get_json()["id"]
+
+    john = call("POST", f"/teams/{team}/users", { "name": "john", "email": f"john.{n}@acme" }).get_json()["id"]
+    sarah = call("POST", f"/teams/{team}/users", { "name": "sarah", "email": f"sarah.{n}@acme" }).get_json()["id"]
+    read = call("POST", f"/teams/{team}/rights", { "name": "read" }).get_json()["id"]
+    write = call("POST", f"/teams/{team}/rights", { "name": "write" }).get_json()["id"]
+    call("POST", "/user-rights", { "user_id": john, "right_id": read })
+    call("POST", "/user-rights", { "user_id": sarah, "right_id": write })
+
+    software = call("POST", f"/teams/{team}/software", { "name": f"app {n}" }).get_json()["id"]
+    apikey = call("GET", f"/software/{software}").get_json()["apikey"]
+    token = call("POST", "/auth", { "name": f"app {n}", "apikey": apikey }, None).get_json()["token"]
+
+    return {
+        "company": company, "unit": unit, "team": team,
+        "john": f"john.{n}@acme", "sarah": f"sarah.{n}@acme", "john_id": john, "sarah_id": sarah,
+        "read": read, "write": write, "token": token,
+        "software": software, "name": f"app {n}", "apikey": apikey
+    }
+
+
+#----- Fixtures
+@pytest.fixture
+def team() -> Dict[str, Any]:
+    """A new team of its own company"""
+    return seed()
+
+@pytest.fixture
+def statements() -> Iterator[List[Tuple[str, Any]]]:
+    """Record the SQL statements executed during a test"""
+    executed: List[Tuple[str, Any]] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(db.engine, "before_cursor_execute", record)
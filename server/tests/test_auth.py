@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Authentication of the software with their apikey
+
+#----- Imports
+import jwt
+import pytest
+
+from sqlalchemy import create_engine, delete, update
+
+from app import app, db
+from app.models import Software
+
+from conftest import call, seed
+
+
+#----- Fixtures
+@pytest.fixture
+def worker():
+    """A connection of its own to the database, standing in for another worker"""
+    engine = create_engine(db.engine.url)
+    yield engine
+    engine.dispose()
+
+
+#----- Functions
+def auth(team):
+    return call("POST", "/auth", { "name": team["name"], "apikey": team["apikey"] }, None)
+
+
+#----- Tests
+@pytest.mark.parametrize("field", [ "name", "apikey" ])
+def test_types(team, field):
+    data = { "name": team["name"], "apikey": team["apikey"], field: 123 }
+    assert call("POST", "/auth", data, None).status_code == 400
+
+def test_deleted_by_another_worker(team, worker):
+    assert auth(team).status_code == 200
+
+    with worker.begin() as connection:
+        connection.execute(delete(Software).where(Software.id == team["software"]))
+
+    assert auth(team).status_code == 404
+
+def test_moved_by_another_worker(team, worker):
+    token = auth(team).get_json()["token"]
+    assert auth(team).get_json()["token"] == token
+
+    other = seed()
+    with worker.begin() as connection:
+        connection.execute(update(Software).where(Software.id == team["software"]).values(team_id=other["team"]))
+
+    # a token for the new team, not the one previously issued
+    token = auth(team).get_json()["token"]
+    assert jwt.decode(token, app.config['DUDE_SECRET_KEY'], "HS256")["team_id"] == f"{other['team']}"
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Deletion of all the records of a table
+
+#----- Imports
+import pytest
+
+from app import db
+
+from conftest import call, seed
+
+
+#----- Tests
+@pytest.mark.parametrize("url, table", [
+    ("/user-rights", "user_right"),
+    ("/users", "user"),
+    ("/rights", "right"),
+    ("/software", "software"),
+    ("/teams", "team"),
+    ("/units", "unit")
+])
+def test_delete_all(team, statements, monkeypatch, url, table):
+    other = seed()
+
+    commits = []
+    commit = db.session.commit
+    monkeypatch.setattr(db.session, "commit", lambda: (commits.append(1), commit()))
+
+    statements.clear()
+    response = call("DELETE", url)
+    assert response.status_code == 204
+    assert f"{table}=" in response.headers["X-Deleted-Rows"]
+
+    # one statement per table, whatever the number of records
+    deletes = [ statement for statement, _ in statements if statement.startswith("DELETE") ]
+    assert len(deletes) == len(set(deletes))
+    assert len(commits) == 1
+
+    assert int(call("GET", url).get_json()["count"]) == 0
+    if table == "user_right":
+        assert call("POST", "/validate", { "token": other["token"], "email": other["john"], "right": "read" }, None).status_code == 403
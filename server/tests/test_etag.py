@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	ETag of a single record
+
+#----- Imports
+import itertools
+
+from app import app, db
+from app.models import Company
+from app.helpers.database import Database
+
+from conftest import call, HEADERS
+
+
+#----- Globals
+# unique names for the companies of these tests
+sequence = itertools.count(1)
+
+
+#----- Functions
+def create() -> int:
+    return call("POST", "/companies", { "name": f"ETag {next(sequence)}" }).get_json()["id"]
+
+def etag(company_id: int) -> str:
+    return call("GET", f"/companies/{company_id}").headers["ETag"]
+
+
+#----- Tests
+def test_other_row_keeps_etag():
+    company, other = create(), create()
+    tag = etag(company)
+
+    call("PUT", f"/companies/{other}", { "name": f"ETag {next(sequence)}" })
+    assert etag(company) == tag
+
+    response = call("GET", f"/companies/{company}", None, dict(HEADERS, **{ "If-None-Match": tag }))
+    assert response.status_code == 304
+
+def test_update_changes_etag():
+    company = create()
+    tag = etag(company)
+
+    call("PUT", f"/companies/{company}", { "name": f"ETag {next(sequence)}" })
+    assert etag(company) != tag
+
+def test_recreated_row_has_new_etag():
+    company = create()
+    tag = etag(company)
+
+    # the id of the last record is not given again after its deletion
+    call("DELETE", f"/companies/{company}")
+    again = create()
+    assert again > company
+    assert etag(again) != tag
+
+def test_rebuild_keeps_rows():
+    company = create()
+
+    with app.app_context():
+        Database.rebuild(Company.__table__)
+        Database.migrate()
+        assert Database.autoincrement(Company.__tablename__)
+        assert db.session.get(Company, company) is not None
+        db.session.remove()
+
+    assert create() > company
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Bulk import of a tree of companies
+
+#----- Imports
+import pytest
+
+from conftest import call
+
+
+#----- Functions
+def tree(name, user=None):
+    """A company with one team holding a single user"""
+    user = user or { "name": "john", "email": f"john@{name}" }
+    return { "companies": [ { "name": name, "units": [ { "name": "IT", "teams": [ { "name": "Ops", "users": [ user ] } ] } ] } ] }
+
+
+#----- Tests
+def test_import():
+    response = call("POST", "/import", tree("import-ok"))
+    assert response.status_code == 200
+    assert response.get_json()["counts"]["user"]["created"] == 1
+
+@pytest.mark.parametrize("companies", [
+    tree("import-name", { "name": 5, "email": "paul@import-name" })["companies"],
+    tree("import-email", { "name": "paul", "email": [ "paul@import-email" ] })["companies"],
+    [ { "name": 5 } ],
+    [ "import-company" ],
+    5
+])
+def test_import_types(companies):
+    response = call("POST", "/import", { "companies": companies })
+    assert response.status_code == 400
+    assert response.is_json
+
+def test_import_missing():
+    response = call("POST", "/import", { "companies": [ { "units": [] } ] })
+    assert response.status_code == 400
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	The hot queries must be answered from the indexes
+
+#----- Imports
+from __future__ import annotations
+from typing import Any, List, Tuple
+
+import pytest
+
+from app import app
+from app.helpers import Permission
+
+from conftest import call, plan
+
+
+#----- Functions
+def indexed(statements: List[Tuple[str, Any]]) -> List[str]:
+    """Check that no statement scans a table, and return all the lines of their plans"""
+    lines: List[str] = []
+    for statement, parameters in statements:
+        details = plan(statement, parameters)
+        scans = [ line for line in details if line.startswith("SCAN") and (line != "SCAN CONSTANT ROW") ]
+        assert not scans, f"{statement}\n{details}"
+        lines.extend(details)
+
+    assert any(line.startswith("SEARCH") and ("INDEX" in line) for line in lines), lines
+    return lines
+
+
+#----- Fixtures
+@pytest.fixture
+def snapshot(monkeypatch, request):
+    """Select the permission snapshot mode of a test, with empty caches"""
+    monkeypatch.setitem(app.config, 'PERMISSION_SNAPSHOT', request.param)
+    Permission.invalidate()
+    yield request.param
+    Permission.invalidate()
+
+
+#----- Tests
+@pytest.mark.parametrize("snapshot", [ "memory", "" ], indirect=True)
+def test_validate(team, statements, snapshot):
+    statements.clear()
+    response = call("POST", "/validate", { "token": team["token"], "email": team["john"], "right": "read" }, None)
+    assert response.status_code == 200
+
+    lines = indexed(statements)
+    if not snapshot:
+        # the single-statement lookup goes through the (team_id, email), (team_id, name) and (user_id, right_id) indexes
+        assert any("ix_user_right_user_id_right_id" in line for line in lines), lines
+
+@pytest.mark.parametrize("snapshot", [ "memory", "" ], indirect=True)
+def test_validate_batch(team, statements, snapshot):
+    checks = [ { "email": team["sarah"], "right": "write" }, { "email": team["sarah"], "right": "read" } ]
+
+    statements.clear()
+    response = call("POST", "/validate/batch", { "token": team["token"], "checks": checks }, None)
+    assert response.status_code == 200
+
+    indexed(statements)
+
+@pytest.mark.parametrize("snapshot", [ "memory", "" ], indirect=True)
+def test_validate_rights(team, statements, snapshot):
+    statements.clear()
+    response = call("POST", "/validate/rights", { "token": team["token"], "email": team["john"] }, None)
+    assert response.status_code == 200
+
+    indexed(statements)
+
+def test_cascade_delete(team, statements):
+    statements.clear()
+    response = call("DELETE", f"/companies/{team['company']}")
+    assert response.status_code == 204
+
+    # the change counters are upserts, without a plan
+    deletes = [ (statement, parameters) for statement, parameters in statements if statement.startswith("DELETE") ]
+    assert len(deletes) == 8
+    indexed(deletes)
+
+def test_reverse_lookup(team, statements):
+    statements.clear()
+    response = call("GET", f"/rights/{team['read']}/users")
+    assert response.status_code == 200
+    assert [ user["email"] for user in response.get_json()["users"] ] == [ team["john"] ]
+
+    # the (right_id, user_id) index returns the users already sorted
+    lines = indexed(statements)
+    assert any("ix_user_right_right_id_user_id" in line for line in lines), lines
+    assert not any("TEMP B-TREE" in line for line in lines), lines
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	The shared snapshot file is used for the teams it is up to date with
+
+#----- Imports
+import pytest
+
+from app import app, db
+from app.helpers import Permission, snapshot
+from app.helpers.shared_snapshot import SharedSnapshot
+
+from conftest import call, seed
+
+
+#----- Functions
+def publish():
+    """Write the snapshot file synchronously"""
+    with app.app_context():
+        SharedSnapshot.write()
+        db.session.remove()
+
+def validate(team, email, right):
+    return call("POST", "/validate", { "token": team["token"], "email": email, "right": right }, None).status_code
+
+
+#----- Fixtures
+@pytest.fixture
+def scheduled(monkeypatch):
+    """Use the shared file, with the background rebuilds recorded instead of started"""
+    calls = []
+    monkeypatch.setitem(app.config, 'PERMISSION_SNAPSHOT', "mmap")
+    monkeypatch.setitem(app.config, 'PERMISSION_VERSION_INTERVAL', 0)
+    monkeypatch.setattr(SharedSnapshot, "schedule", staticmethod(lambda: calls.append(1)))
+    Permission.invalidate()
+    yield calls
+    Permission.invalidate()
+
+
+#----- Tests
+def test_write_to_another_team(team, scheduled):
+    other = seed()
+    publish()
+    assert validate(other, other["john"], "read") == 200
+    assert other["team"] not in snapshot.teams
+
+    # the new grant is answered from memory until the file is rebuilt, the other team from the file
+    call("POST", "/user-rights", { "user_id": team["john_id"], "right_id": team["write"] })
+    assert scheduled
+    assert validate(team, team["john"], "write") == 200
+    assert team["team"] in snapshot.teams
+
+    assert validate(other, other["john"], "read") == 200
+    assert other["team"] not in snapshot.teams
+
+    # once published, the file answers again
+    publish()
+    Permission.invalidate()
+    assert validate(team, team["john"], "write") == 200
+    assert team["team"] not in snapshot.teams
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Subtree of a company in each negotiated mimetype
+
+#----- Imports
+import json
+
+import pytest
+
+from conftest import call, HEADERS
+
+
+#----- Functions
+def read(company, accept, depth=3):
+    """Read the tree of a company with its whole streamed body"""
+    response = call("GET", f"/companies/{company}/tree?depth={depth}", None, dict(HEADERS, Accept=accept))
+    return response, b"".join(response.response)
+
+
+#----- Tests
+@pytest.mark.parametrize("depth", [ 0, 1, 3 ])
+def test_tree_msgpack(team, depth):
+    msgpack = pytest.importorskip("msgpack")
+
+    response, body = read(team["company"], "application/json", depth)
+    assert response.mimetype == "application/json"
+    assert "Accept" in response.vary
+    document = json.loads(body)
+
+    response, body = read(team["company"], "application/msgpack", depth)
+    assert response.mimetype == "application/msgpack"
+    assert "Accept" in response.vary
+    assert msgpack.unpackb(body) == document
+
+def test_tree_document(team):
+    _, body = read(team["company"], "application/json")
+    document = json.loads(body)
+
+    assert document["id"] == team["company"]
+    teams = document["units"][0]["teams"]
+    assert [ user["id"] for user in teams[0]["users"] ] == [ team["john_id"], team["sarah_id"] ]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Answers of the /validate endpoints
+
+#----- Imports
+import pytest
+
+from app import app
+from app.helpers import Permission
+from app.helpers.bloom import Bloom
+from app.helpers.versions import Versions
+
+from conftest import call
+
+
+#----- Fixtures
+@pytest.fixture(params=[ "memory", "mmap", "" ])
+def snapshot(monkeypatch, request):
+    """Run a test with each permission snapshot mode, with empty caches"""
+    monkeypatch.setitem(app.config, 'PERMISSION_SNAPSHOT', request.param)
+    Permission.invalidate()
+    yield request.param
+    Permission.invalidate()
+
+
+#----- Tests
+@pytest.mark.parametrize("field", [ "email", "right" ])
+def test_validate_types(team, snapshot, field):
+    data = { "token": team["token"], "email": team["john"], "right": "read", field: 123 }
+    response = call("POST", "/validate", data, None)
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("checks", [
+    5,
+    "john",
+    { "email": "john", "right": "read" },
+    [ 5 ],
+    [ [ "john", "read" ] ],
+    [ { "email": 5, "right": "read" } ],
+    [ { "email": "john", "right": None } ]
+])
+def test_validate_batch_types(team, checks):
+    response = call("POST", "/validate/batch", { "token": team["token"], "checks": checks }, None)
+    assert response.status_code == 400
+    assert response.is_json
+
+def test_validate_batch_missing(team):
+    response = call("POST", "/validate/batch", { "token": team["token"], "checks": [ { "email": team["john"] } ] }, None)
+    assert response.status_code == 400
+
+def test_validate_rights_types(team, snapshot):
+    response = call("POST", "/validate/rights", { "token": team["token"], "email": [ team["john"] ] }, None)
+    assert response.status_code == 400
+
+def test_bloom_rejects_without_query(team, monkeypatch, statements):
+    monkeypatch.setitem(app.config, 'PERMISSION_SNAPSHOT', "")
+    Permission.invalidate()
+
+    data = { "token": team["token"], "email": "nobody@acme", "right": "read" }
+    assert call("POST", "/validate", data, None).status_code == 401
+
+    # an email the filter of the team rejects (any other one may be a false positive)
+    with app.app_context():
+        bloom = Bloom.team(int(team["team"]), Versions.team(int(team["team"])))
+    email = next(email for email in (f"somebody.{n}@acme" for n in range(100)) if b"e:" + email.encode() not in bloom)
+
+    statements.clear()
+    assert call("POST", "/validate", dict(data, email=email), None).status_code == 401
+    assert not statements
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	The version of a team follows the writes to its users, rights and grants
+
+#----- Imports
+import sqlite3
+
+from app import app, db
+from app.helpers import snapshot
+from app.helpers.versions import Versions
+
+from conftest import call, seed
+
+
+#----- Functions
+def versions():
+    with app.app_context():
+        return Versions.all()
+
+def validate(team, email, right):
+    return call("POST", "/validate", { "token": team["token"], "email": email, "right": right }, None).status_code
+
+
+#----- Tests
+def test_write_bumps_its_team_only(team):
+    other = seed()
+    before = versions()
+
+    call("POST", f"/teams/{team['team']}/users", { "name": "paul", "email": f"paul.{team['team']}@acme" })
+
+    after = versions()
+    assert after[team["team"]] > before[team["team"]]
+    assert after[other["team"]] == before[other["team"]]
+
+def test_raw_write_bumps_version(team):
+    before = versions()[team["team"]]
+
+    writer = sqlite3.connect(db.engine.url.database)
+    writer.execute('UPDATE "right" SET name = ? WHERE id = ?', ("view", team["read"]))
+    writer.commit()
+    writer.close()
+
+    assert versions()[team["team"]] == before + 1
+
+def test_warm_check_runs_no_statement(team, statements):
+    other = seed()
+    assert validate(team, team["john"], "read") == 200
+    compiled = snapshot.teams[team["team"]]
+
+    # a write to another team keeps the snapshot of this one
+    call("POST", f"/teams/{other['team']}/users", { "name": "paul", "email": f"paul.{other['team']}@acme" })
+
+    statements.clear()
+    assert validate(team, team["john"], "read") == 200
+    assert snapshot.teams[team["team"]] is compiled
+    assert not statements
+
+def test_other_worker_write(team, monkeypatch):
+    monkeypatch.setitem(app.config, 'PERMISSION_VERSION_INTERVAL', 0)
+    assert validate(team, team["john"], "read") == 200
+
+    # the grant is removed by another process
+    writer = sqlite3.connect(db.engine.url.database)
+    writer.execute('DELETE FROM user_right WHERE right_id = ?', (team["read"],))
+    writer.commit()
+    writer.close()
+
+    assert validate(team, team["john"], "read") == 403
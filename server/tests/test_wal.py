@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# vim: set ft=python
+#
+# This source file is subject to the Apache License 2.0
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/licenses/Apache-2.0
+#
+# @author	Sebastien LEGRAND
+# @license	Apache License 2.0
+#
+# @brief	Readers are not blocked by a write in progress (WAL journal)
+
+#----- Imports
+import sqlite3
+import time
+
+from app import app, db
+
+from conftest import call
+
+
+#----- Tests
+def test_journal_mode():
+    with db.engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+
+def test_reader_during_write():
+    # another process holds the write lock with an uncommitted company
+    writer = sqlite3.connect(db.engine.url.database, isolation_level=None)
+    try:
+        writer.execute("BEGIN EXCLUSIVE")
+        company_id = writer.execute("INSERT INTO company (name, version) VALUES ('Uncommitted', 1)").lastrowid
+
+        # the reader neither waits for the busy timeout nor sees the row
+        start = time.monotonic()
+        assert call("GET", "/companies").status_code == 200
+        assert call("GET", f"/companies/{company_id}").status_code == 404
+        assert time.monotonic() - start < app.config['SQLITE_PRAGMAS']['busy_timeout'] / 1000 / 2
+
+        writer.execute("COMMIT")
+    finally:
+        writer.close()
+
+    # once committed, the row is visible
+    assert call("GET", f"/companies/{company_id}").status_code == 200
+    assert call("DELETE", f"/companies/{company_id}").status_code == 204
@@ -13,13 +13,14 @@
 
 #----- Imports
 import logging
-from app import app, db
+from app import app
+from app.helpers import Database
 
 
 #----- Begin
 
-# create the SQLAlchemy tables
-db.create_all()
+# create the SQLAlchemy tables and migrate existing databases (one worker at a time)
+Database.initialize()
 
 # configure gunicorn logs
 if __name__ != "__main__":